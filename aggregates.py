@@ -0,0 +1,349 @@
+import glob
+import os
+import re
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import telemetry
+from resale_data import CATEGORICAL_COLUMNS, dataset_version, load_resale_data, read_arrow_snapshot
+
+CUBE_DIR = "db"
+CUBE_DIMENSIONS = ["town", "flat_type", "month", "storey_range"]
+GROUP_BY_OPTIONS = ["town", "flat_type", "storey_range", "month", "year"]
+
+
+def build_cube(df):
+    """Aggregates resale prices over town x flat_type x month x storey_range."""
+    frame = df[CUBE_DIMENSIONS + ["resale_price", "floor_area_sqm"]].assign(
+        price_per_sqm=df["resale_price"] / df["floor_area_sqm"]
+    )
+    grouped = frame.groupby(CUBE_DIMENSIONS, observed=True)
+    price = grouped["resale_price"]
+    cube = pd.DataFrame({
+        "count": price.size(),
+        "price_sum": price.sum(),
+        "median_price": price.median(),
+        "p25_price": price.quantile(0.25),
+        "p75_price": price.quantile(0.75),
+        "min_price": price.min(),
+        "max_price": price.max(),
+        "price_per_sqm_sum": grouped["price_per_sqm"].sum(),
+        "median_price_per_sqm": grouped["price_per_sqm"].median(),
+    })
+    cube["mean_price"] = cube["price_sum"] / cube["count"]
+    return cube.reset_index()
+
+
+def _cube_path(version):
+    return os.path.join(CUBE_DIR, f"resale_cube-{version}.parquet")
+
+
+def _save_cube(cube, version):
+    os.makedirs(CUBE_DIR, exist_ok=True)
+    tmp_path = f"{_cube_path(version)}.{os.getpid()}.tmp"
+    cube.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, _cube_path(version))
+    for path in glob.glob(_cube_path("*")):
+        if path != _cube_path(version):
+            os.remove(path)
+
+
+def update_cube(previous_version, version, months):
+    """Recomputes only the cube cells of `months` after they were ingested, and saves the cube as `version`.
+
+    Falls back to a full build when the previous version's cube was never saved.
+    """
+    df = read_arrow_snapshot()
+    if not os.path.exists(_cube_path(previous_version)):
+        cube = build_cube(df)
+    else:
+        cube = pd.read_parquet(_cube_path(previous_version))
+        changed = pd.to_datetime(months, format="%Y-%m")
+        cube = pd.concat([cube[~cube["month"].isin(changed)], build_cube(df[df["month"].isin(changed)])],
+                         ignore_index=True)
+        for column in [c for c in CUBE_DIMENSIONS if c in CATEGORICAL_COLUMNS]:
+            cube[column] = cube[column].astype("category")
+    _save_cube(cube, version)
+    return cube
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_cube(version, _df):
+    if os.path.exists(_cube_path(version)):
+        return pd.read_parquet(_cube_path(version))
+    cube = build_cube(_df)
+    _save_cube(cube, version)
+    return cube
+
+
+def load_cube():
+    """Returns the process-wide aggregate cube for the loaded dataset."""
+    return _load_cube(dataset_version(), load_resale_data())
+
+
+def _weighted_median(values, weights):
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    return values[order][np.searchsorted(cumulative, cumulative[-1] / 2)]
+
+
+def _roll_up(cells):
+    count = cells["count"].to_numpy()
+    return pd.Series({
+        "count": int(count.sum()),
+        "mean_price": cells["price_sum"].sum() / count.sum(),
+        "median_price": _weighted_median(cells["median_price"].to_numpy(), count),
+        "p25_price": _weighted_median(cells["p25_price"].to_numpy(), count),
+        "p75_price": _weighted_median(cells["p75_price"].to_numpy(), count),
+        "min_price": cells["min_price"].min(),
+        "max_price": cells["max_price"].max(),
+        "mean_price_per_sqm": cells["price_per_sqm_sum"].sum() / count.sum(),
+        "median_price_per_sqm": _weighted_median(cells["median_price_per_sqm"].to_numpy(), count),
+    })
+
+
+QUANTILE_COLUMNS = ["median_price", "p25_price", "p75_price", "median_price_per_sqm"]
+
+
+def exact_quantiles(df, town=None, flat_type=None, storey_range=None, start_month=None, end_month=None, group_by=None):
+    """Computes the median, 25th/75th percentile price and median price per sqm over the raw transactions.
+
+    The filters select rows by category code and month with one vectorized
+    mask, so only the matching rows' prices are grouped.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for column, value in (("town", town), ("flat_type", flat_type), ("storey_range", storey_range)):
+        if value:
+            codes = [i for i, c in enumerate(df[column].cat.categories) if str(c).upper() == value.upper()]
+            mask &= np.isin(df[column].cat.codes.to_numpy(), codes)
+    if start_month:
+        mask &= (df["month"] >= pd.Timestamp(start_month)).to_numpy()
+    if end_month:
+        mask &= (df["month"] <= pd.Timestamp(end_month) + pd.offsets.MonthEnd(0)).to_numpy()
+
+    group_by = group_by or []
+    rows = df.loc[mask, list(dict.fromkeys([g for g in group_by if g != "year"] + ["month", "resale_price", "floor_area_sqm"]))]
+    frame = pd.DataFrame({g: rows["month"].dt.year if g == "year" else rows[g] for g in group_by})
+    frame["price"] = rows["resale_price"]
+    frame["price_per_sqm"] = rows["resale_price"] / rows["floor_area_sqm"]
+    grouped = frame.groupby(group_by, observed=True) if group_by else frame
+    result = {
+        "median_price": grouped["price"].median(),
+        "p25_price": grouped["price"].quantile(0.25),
+        "p75_price": grouped["price"].quantile(0.75),
+        "median_price_per_sqm": grouped["price_per_sqm"].median(),
+    }
+    return pd.DataFrame(result).reset_index() if group_by else pd.DataFrame([result])
+
+
+def query_cube(
+    cube,
+    town: Optional[str] = None,
+    flat_type: Optional[str] = None,
+    storey_range: Optional[str] = None,
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None,
+    group_by: Optional[list] = None,
+    df=None,
+):
+    """Filters the cube and rolls the matching cells up to `group_by`.
+
+    Counts, means and min/max roll up exactly. Medians and percentiles do not:
+    given the transactions `df`, they are recomputed from the matching rows.
+    Without it, those of several cells are count-weighted medians of the cell
+    values, a close approximation only.
+    """
+    cells = cube
+    if town:
+        cells = cells[cells["town"].astype(str).str.upper() == town.upper()]
+    if flat_type:
+        cells = cells[cells["flat_type"].astype(str).str.upper() == flat_type.upper()]
+    if storey_range:
+        cells = cells[cells["storey_range"].astype(str).str.upper() == storey_range.upper()]
+    if start_month:
+        cells = cells[cells["month"] >= pd.Timestamp(start_month)]
+    if end_month:
+        cells = cells[cells["month"] <= pd.Timestamp(end_month) + pd.offsets.MonthEnd(0)]
+    if cells.empty:
+        return pd.DataFrame()
+
+    group_by = [g for g in (group_by or []) if g in GROUP_BY_OPTIONS]
+    if "year" in group_by:
+        cells = cells.assign(year=cells["month"].dt.year)
+    if not group_by:
+        result = pd.DataFrame([_roll_up(cells)])
+    else:
+        result = cells.groupby(group_by, observed=True).apply(_roll_up, include_groups=False).reset_index()
+    if df is None:
+        return result
+    exact = exact_quantiles(df, town, flat_type, storey_range, start_month, end_month, group_by)
+    if not group_by:
+        return result.assign(**{column: exact[column].iloc[0] for column in QUANTILE_COLUMNS})
+    # Groups are matched on their keys as text, since the cube's and the frame's categories may differ.
+    exact.index = pd.MultiIndex.from_arrays([exact[g].astype(str) for g in group_by])
+    keys = pd.MultiIndex.from_arrays([result[g].astype(str) for g in group_by])
+    result[QUANTILE_COLUMNS] = exact[QUANTILE_COLUMNS].reindex(keys).to_numpy()
+    return result
+
+
+@telemetry.traced("resale_statistics")
+def resale_statistics(
+    town: Optional[str] = None,
+    flat_type: Optional[str] = None,
+    storey_range: Optional[str] = None,
+    start_month: Optional[str] = None,
+    end_month: Optional[str] = None,
+    group_by: Optional[list] = None,
+) -> str:
+    """Returns precomputed HDB resale price statistics (transaction count, mean,
+    median, 25th/75th percentile, min/max price and price per sqm).
+
+    town: e.g. "TAMPINES". flat_type: e.g. "4 ROOM", "EXECUTIVE".
+    storey_range: e.g. "10 TO 12". start_month/end_month: "YYYY-MM".
+    group_by: any of "town", "flat_type", "storey_range", "month", "year".
+    """
+    result = query_cube(load_cube(), town, flat_type, storey_range, start_month, end_month, group_by, df=load_resale_data())
+    if result.empty:
+        return "No transactions match these filters."
+    return result.round(1).to_markdown(index=False)
+
+
+@st.cache_resource(show_spinner=False)
+def cube_tool():
+    """Wraps `resale_statistics` as a structured tool for the analyst agent, shared by every request."""
+    from langchain_core.tools import StructuredTool
+
+    return StructuredTool.from_function(
+        func=resale_statistics,
+        name="Query precomputed resale statistics",
+        description=(
+            "Fast lookup of resale price statistics by town, flat type, storey range and month range, "
+            "optionally grouped by town/flat_type/storey_range/month/year. All figures are exact, computed over "
+            "the matching transactions. Prefer this over writing code."
+        ),
+    )
+
+
+METRICS = [
+    (r"price per (?:sqm|square met(?:er|re))|psm", "median_price_per_sqm", "median price per sqm"),
+    (r"how many|number of|count|volume", "count", "number of transactions"),
+    (r"highest|maximum|max|most expensive|priciest", "max_price", "highest resale price"),
+    (r"lowest|minimum|min|cheapest|least expensive", "min_price", "lowest resale price"),
+    (r"average|mean", "mean_price", "average resale price"),
+    (r"median|typical|how much|price", "median_price", "median resale price"),
+]
+
+# Questions about change, ranking or differences need the crew even when they name a metric.
+UNSUPPORTED = re.compile(
+    r"\b(why|predict\w*|forecast\w*|should|recommend\w*|compare\w*|comparison|versus|vs|chang\w*|increas\w*|"
+    r"decreas\w*|ris(e|es|en|ing)|rose|fall\w*|fell|drop\w*|grow\w*|grew|jump\w*|before|after|since|which|"
+    r"rank\w*|top|differ\w*|between|gap|more|less|than)\b"
+)
+YEARS = r"\b(20[12]\d)\b"
+FLAT_TYPE = r"\b[1-5][\s-]*(?:room|rm)\b|\bexecutive\b|\bmulti[\s-]generation\b"
+YEAR_GROUPING = r"\b(trend|over time|over the years|each year|by year|yearly|annual)\b"
+TOWN_GROUPING = r"\b(by|across|each|every|per) towns?\b"
+FLAT_TYPE_GROUPING = r"\b(by|across|each|every|per) flat types?\b"
+
+# Words that may be left over once the metric, town, flat type, years and grouping are matched.
+FILLER_WORDS = {
+    "what", "what's", "whats", "is", "was", "were", "are", "the", "a", "an", "of", "for", "in", "on", "at", "to",
+    "from", "during", "hdb", "resale", "flat", "flats", "unit", "units", "price", "prices", "paid", "sold",
+    "transacted", "transaction", "transactions", "cost", "did", "do", "does", "has", "have", "there", "been",
+    "how", "much", "many", "tell", "me", "show", "give", "please", "town", "estate", "year", "s",
+}
+
+
+def _match_flat_type(text):
+    match = re.search(r"\b([1-5])[\s-]*(?:room|rm)\b", text)
+    if match:
+        return f"{match.group(1)} ROOM"
+    if "executive" in text:
+        return "EXECUTIVE"
+    if "multi-generation" in text or "multi generation" in text:
+        return "MULTI-GENERATION"
+    return None
+
+
+def _town_pattern(town):
+    return r"\b" + re.escape(town.lower()).replace("/", r"\s*/\s*") + r"\b"
+
+
+def _match_town(text, towns):
+    for town in sorted(towns, key=len, reverse=True):
+        if re.search(_town_pattern(town), text):
+            return town
+    return None
+
+
+def _fully_understood(text, patterns):
+    """True when nothing but filler words is left after removing every matched pattern from `text`."""
+    for pattern in patterns:
+        text = re.sub(pattern, " ", text)
+    return all(word in FILLER_WORDS for word in re.findall(r"[a-z']+|\d+", text))
+
+
+def match_intent(topic):
+    """Answers common question shapes straight from the cube.
+
+    Returns a dict with a markdown `answer`, the result `table` and a suggested
+    `chart` type with its `x`/`y` columns, or None when the question needs the
+    full crew.
+    """
+    text = topic.lower()
+    if UNSUPPORTED.search(text):
+        return None
+    metric = next(((rf"\b(?:{pattern})\b", column, label) for pattern, column, label in METRICS
+                   if re.search(rf"\b(?:{pattern})\b", text)), None)
+    if metric is None:
+        return None
+    metric_pattern, column, label = metric
+
+    cube = load_cube()
+    town = _match_town(text, cube["town"].cat.categories.astype(str))
+    flat_type = _match_flat_type(text)
+    years = sorted(int(y) for y in re.findall(YEARS, text))
+    group_by = []
+    if re.search(YEAR_GROUPING, text):
+        group_by.append("year")
+    if re.search(TOWN_GROUPING, text) and not town:
+        group_by.append("town")
+    if re.search(FLAT_TYPE_GROUPING, text) and not flat_type:
+        group_by.append("flat_type")
+    if not (town or flat_type or group_by):
+        return None
+    # Anything else in the question (a second town, a price, a condition) would be silently ignored.
+    patterns = [metric_pattern, FLAT_TYPE, YEARS, YEAR_GROUPING, TOWN_GROUPING, FLAT_TYPE_GROUPING]
+    if not _fully_understood(text, patterns + ([_town_pattern(town)] if town else [])):
+        return None
+
+    start_month = f"{years[0]}-01" if years else None
+    end_month = f"{years[-1]}-12" if years else None
+    table = query_cube(cube, town=town, flat_type=flat_type, start_month=start_month,
+                       end_month=end_month, group_by=group_by, df=load_resale_data())
+    if table.empty:
+        return None
+
+    scope = " ".join(part for part in [flat_type and flat_type.lower() + " flats", town and "in " + town.title()] if part) or "all flats"
+    period = f" from {years[0]} to {years[-1]}" if len(years) > 1 else (f" in {years[0]}" if years else "")
+    table = table[group_by + [column, "count"]] if column != "count" else table[group_by + ["count"]]
+    if group_by:
+        answer = f"**{label.capitalize()} for {scope}{period}, by {', '.join(group_by).replace('_', ' ')}:**\n\n"
+        answer += table.round(0).to_markdown(index=False)
+    else:
+        value = table[column].iloc[0]
+        figure = f"{int(value):,}" if column == "count" else f"${value:,.0f}"
+        answer = f"The {label} for {scope}{period} is **{figure}**, based on {int(table['count'].iloc[0]):,} transactions."
+    chart = None
+    if len(group_by) == 1:
+        chart = "line" if group_by[0] == "year" else "bar"
+    return {
+        "answer": answer,
+        "table": table,
+        "chart": chart,
+        "x": group_by[0] if group_by else None,
+        "y": column,
+    }
@@ -0,0 +1,367 @@
+"""Offline benchmark for the Personalised Guide and Historical Insights pipelines.
+
+Drives `question_ai` and `data_ai` headlessly against a local, deterministic
+OpenAI-compatible server and the HDB fixture pages in benchmarks/fixtures,
+replaying benchmarks/questions.json at a configurable concurrency:
+
+    python benchmark.py --concurrency 4 --repeat 2
+    python benchmark.py --save-baseline benchmarks/baseline.json
+    python benchmark.py --baseline benchmarks/baseline.json --tolerance 0.2
+
+Everything runs in a temporary working directory, so db/ is never touched.
+The run exits with status 1 if latency, tokens or memory regress beyond the
+tolerance against the baseline.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CORPUS_PATH = os.path.join(ROOT, "benchmarks", "questions.json")
+FIXTURES_PATH = os.path.join(ROOT, "benchmarks", "fixtures")
+EMBEDDING_DIMENSIONS = 256
+
+CHART_SPEC = {
+    "chart": "line", "title": "Median resale price by year", "group_by": ["year"],
+    "metric": "median_price", "filters": {}, "time_range": {"start": "2017-01", "end": "2024-10"},
+}
+
+
+def _count_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _embedding(text):
+    """Deterministic bag-of-hashed-words embedding, so similar texts get similar vectors."""
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.sha256(word.encode("utf-8")).digest()
+        vector[digest[0] % EMBEDDING_DIMENSIONS] += 1.0 if digest[1] % 2 else -1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+class MockLLM:
+    """Deterministic chat responses shaped like what each agent is expected to return."""
+
+    def __init__(self, latency=0.0, token_delay=0.0, recordings=None):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.recordings = recordings or {}
+
+    def respond(self, body):
+        messages = body.get("messages", [])
+        prompt = "\n".join(str(m.get("content") or "") for m in messages)
+        recorded = self.recordings.get(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        if recorded is not None:
+            return recorded
+
+        tools = re.findall(r"Tool Name: (.+)", prompt)
+        # Agents with tools make one tool call first; the follow-up request carries the observation.
+        if tools and not any(m.get("role") == "assistant" for m in messages):
+            topic = re.sub(r"\s+", " ", prompt.split("Current Task:")[-1])[:80].replace('"', "'")
+            return f'Thought: I should look this up.\nAction: {tools[0].strip()}\nAction Input: {{"query": "{topic}"}}'
+        if "JSON chart specification" in prompt or "chart spec" in prompt.lower():
+            answer = json.dumps(CHART_SPEC)
+        else:
+            answer = (
+                "## Summary\n\nThis is a deterministic benchmark answer. "
+                + " ".join(f"Point {i}: resale flats, eligibility, grants and prices." for i in range(1, 25))
+            )
+        if "Final Answer" in prompt or "Thought:" in prompt:
+            return f"Thought: I now know the final answer\nFinal Answer: {answer}"
+        return answer
+
+
+def make_handler(llm):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path.endswith("/embeddings"):
+                inputs = body.get("input", [])
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                self._send_json({
+                    "object": "list",
+                    "model": body.get("model"),
+                    "data": [{"object": "embedding", "index": i, "embedding": _embedding(str(text))}
+                             for i, text in enumerate(inputs)],
+                    "usage": {"prompt_tokens": sum(_count_tokens(str(t)) for t in inputs),
+                              "total_tokens": sum(_count_tokens(str(t)) for t in inputs)},
+                })
+                return
+
+            time.sleep(llm.latency)
+            text = llm.respond(body)
+            prompt_tokens = sum(_count_tokens(str(m.get("content") or "")) for m in body.get("messages", []))
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": _count_tokens(text),
+                     "total_tokens": prompt_tokens + _count_tokens(text)}
+            base = {"id": "chatcmpl-" + uuid.uuid4().hex, "created": int(time.time()), "model": body.get("model")}
+            if not body.get("stream"):
+                self._send_json({**base, "object": "chat.completion", "usage": usage, "choices": [
+                    {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}
+                ]})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+
+            def send(payload):
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            for piece in re.findall(r"\S+\s*", text):
+                time.sleep(llm.token_delay)
+                send({**base, "object": "chat.completion.chunk", "choices": [
+                    {"index": 0, "delta": {"content": piece}, "finish_reason": None}
+                ]})
+            send({**base, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {}, "finish_reason": "stop"}
+            ]})
+            if (body.get("stream_options") or {}).get("include_usage"):
+                send({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+
+    return Handler
+
+
+def start_mock_server(llm):
+    """Starts the mock OpenAI-compatible server on a free local port and returns its base URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(llm))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def write_synthetic_dataset(path, rows=20000, seed=0):
+    """Writes a deterministic CSV with the resale dataset's schema."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    towns = ["ANG MO KIO", "BEDOK", "BUKIT BATOK", "JURONG WEST", "PUNGGOL", "SENGKANG", "TAMPINES", "WOODLANDS"]
+    flat_types = ["2 ROOM", "3 ROOM", "4 ROOM", "5 ROOM", "EXECUTIVE"]
+    storeys = ["01 TO 03", "04 TO 06", "07 TO 09", "10 TO 12", "13 TO 15", "16 TO 18"]
+    months = pd.period_range("2017-01", "2024-10", freq="M").astype(str)
+    type_index = rng.integers(0, len(flat_types), rows)
+    area = 45 + type_index * 22 + rng.normal(0, 5, rows)
+    lease_start = rng.integers(1975, 2020, rows)
+    month = rng.choice(months, rows)
+    remaining = 99 - (pd.to_datetime(month).year.to_numpy() - lease_start)
+    pd.DataFrame({
+        "month": month,
+        "town": rng.choice(towns, rows),
+        "flat_type": np.array(flat_types)[type_index],
+        "block": rng.integers(100, 999, rows).astype(str),
+        "street_name": rng.choice(["ANG MO KIO AVE 3", "BEDOK NTH RD", "TAMPINES ST 21", "PUNGGOL FIELD"], rows),
+        "storey_range": rng.choice(storeys, rows),
+        "floor_area_sqm": area.round(0),
+        "flat_model": rng.choice(["Improved", "New Generation", "Model A", "Premium Apartment"], rows),
+        "lease_commence_date": lease_start,
+        "remaining_lease": [f"{r} years {m:02d} months" for r, m in zip(remaining, rng.integers(0, 12, rows))],
+        "resale_price": (area * 4800 + remaining * 2500 + rng.normal(0, 40000, rows)).round(-3),
+    }).to_csv(path, index=False)
+
+
+def prepare_workspace(dataset):
+    """Creates the temporary working directory with the dataset and an indexed HDB fixture site."""
+    workspace = tempfile.mkdtemp(prefix="hdb-benchmark-")
+    os.chdir(workspace)
+    import resale_data
+
+    if dataset:
+        shutil.copy(dataset, resale_data.CSV_PATH)
+    else:
+        write_synthetic_dataset(resale_data.CSV_PATH)
+
+    import hdb_index
+
+    hdb_index.ingest(hdb_index.read_fixture_pages(FIXTURES_PATH))
+    return workspace
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_benchmark(corpus, concurrency, repeat):
+    """Replays the corpus and returns the report dict."""
+    import telemetry
+    from guide_pipeline import question_ai
+    from insights_pipeline import data_ai
+    from resale_data import dataset_version
+
+    requests = []
+    version = dataset_version()
+    for _ in range(repeat):
+        requests += [("guide", telemetry.instrument("guide", question_ai), (q["question"], q["profile"]))
+                     for q in corpus.get("guide", [])]
+        requests += [("insights", telemetry.instrument("insights", data_ai), (topic, version))
+                     for topic in corpus.get("insights", [])]
+
+    def run(request):
+        pipeline, fn, args = request
+        start = time.perf_counter()
+        error = None
+        try:
+            fn(*args)
+        except Exception as e:
+            error = f"{e.__class__.__name__}: {e}"
+        return pipeline, time.perf_counter() - start, error
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run, requests))
+    wall_seconds = time.perf_counter() - started
+
+    spans = telemetry.load_spans()
+    report = {"concurrency": concurrency, "requests": len(results), "wall_seconds": round(wall_seconds, 3),
+              "pipelines": {}, "stages": {}}
+    for pipeline in sorted({r[0] for r in results}):
+        latencies = [seconds for name, seconds, _ in results if name == pipeline]
+        pipeline_requests = spans[(spans["kind"] == "request") & (spans["pipeline"] == pipeline)]
+        report["pipelines"][pipeline] = {
+            "requests": len(latencies),
+            "errors": sum(1 for name, _, error in results if name == pipeline and error),
+            "p50_seconds": round(_percentile(latencies, 0.5), 3),
+            "p95_seconds": round(_percentile(latencies, 0.95), 3),
+            "max_seconds": round(max(latencies), 3),
+            "mean_seconds": round(statistics.mean(latencies), 3),
+            "prompt_tokens": int(pipeline_requests["prompt_tokens"].sum()),
+            "completion_tokens": int(pipeline_requests["completion_tokens"].sum()),
+        }
+    for (pipeline, stage), group in spans[spans["kind"] != "request"].groupby(["pipeline", "stage"]):
+        report["stages"][f"{pipeline}/{stage}"] = {
+            "calls": len(group),
+            "mean_seconds": round(group["seconds"].mean(), 3),
+            "p95_seconds": round(group["seconds"].quantile(0.95), 3),
+            "tokens": int((group["prompt_tokens"] + group["completion_tokens"]).sum()),
+        }
+    if resource:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+        scale = 1 if sys.platform == "darwin" else 1024
+        report["memory_peak_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20, 1)
+    report["errors"] = [error for _, _, error in results if error][:10]
+    return report
+
+
+def find_regressions(report, baseline, tolerance):
+    """Lists metrics that are worse than the baseline by more than `tolerance` (a fraction)."""
+    regressions = []
+
+    def check(label, current, previous, tolerance=tolerance):
+        # A baseline of 0 is a real baseline: anything above it is a regression.
+        if current is not None and previous is not None and current > previous * (1 + tolerance):
+            regressions.append(f"{label}: {current} vs baseline {previous}")
+
+    for pipeline, metrics in baseline.get("pipelines", {}).items():
+        current = report["pipelines"].get(pipeline)
+        if current is None:
+            continue
+        for metric in ["p50_seconds", "p95_seconds", "prompt_tokens", "completion_tokens"]:
+            check(f"{pipeline} {metric}", current[metric], metrics.get(metric))
+        # Any additional error fails the run, whatever the tolerance.
+        check(f"{pipeline} errors", current["errors"], metrics.get("errors"), tolerance=0)
+    check("memory_peak_mb", report.get("memory_peak_mb"), baseline.get("memory_peak_mb"))
+    return regressions
+
+
+def print_report(report):
+    print(f"{report['requests']} requests at concurrency {report['concurrency']} in {report['wall_seconds']}s")
+    for pipeline, metrics in report["pipelines"].items():
+        print(f"  {pipeline:<9} p50 {metrics['p50_seconds']:>7}s  p95 {metrics['p95_seconds']:>7}s  "
+              f"max {metrics['max_seconds']:>7}s  tokens {metrics['prompt_tokens']}+{metrics['completion_tokens']}  "
+              f"errors {metrics['errors']}")
+    for stage, metrics in report["stages"].items():
+        print(f"    {stage:<40} calls {metrics['calls']:>4}  mean {metrics['mean_seconds']:>7}s  "
+              f"p95 {metrics['p95_seconds']:>7}s  tokens {metrics['tokens']}")
+    if "memory_peak_mb" in report:
+        print(f"  memory peak {report['memory_peak_mb']} MB")
+    for error in report["errors"]:
+        print(f"  error: {error}")
+
+
+if __name__ == "__main__":
+    import bootstrap  # noqa: F401 -- swaps in pysqlite3 for Chroma
+
+    parser = argparse.ArgumentParser(description="Benchmark the agent pipelines against a mock LLM.")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="questions to replay (JSON)")
+    parser.add_argument("--dataset", help="resale CSV to use instead of a synthetic one")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1, help="replay the corpus this many times")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds before each mock completion")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="seconds between streamed mock tokens")
+    parser.add_argument("--recordings", help="JSON mapping sha256(prompt) to a recorded response")
+    parser.add_argument("--output", help="write the report JSON here")
+    parser.add_argument("--baseline", help="fail on regressions against this report JSON")
+    parser.add_argument("--save-baseline", help="write the report JSON here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        corpus = json.load(f)
+    recordings = None
+    if args.recordings:
+        with open(args.recordings) as f:
+            recordings = json.load(f)
+    dataset = os.path.abspath(args.dataset) if args.dataset else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    output_paths = [os.path.abspath(p) for p in (args.output, args.save_baseline) if p]
+
+    server, base_url = start_mock_server(MockLLM(args.llm_latency, args.token_delay, recordings))
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_MODEL_NAME": "gpt-4o-mini",
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_BASE": base_url,
+    })
+    workspace = prepare_workspace(dataset)
+    try:
+        report = run_benchmark(corpus, args.concurrency, args.repeat)
+    finally:
+        server.shutdown()
+        os.chdir(ROOT)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    print_report(report)
+    for path in output_paths:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = find_regressions(report, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against baseline.")
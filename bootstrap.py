@@ -0,0 +1,89 @@
+"""Process-wide start-up shared by every page: import this module before anything else.
+
+Importing it swaps in pysqlite3 (Chroma needs a newer SQLite than some hosts
+ship) before any module imports sqlite3. `load_environment` copies the OpenAI
+settings from .env or Streamlit secrets into the environment once per process.
+
+Run `python bootstrap.py` to measure how long each page's imports take on a
+cold interpreter, using Python's `-X importtime`.
+"""
+import argparse
+import ast
+import glob
+import os
+import subprocess
+import sys
+
+try:
+    __import__('pysqlite3')
+    sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+except ImportError:
+    # Local development without pysqlite3 keeps the standard library sqlite3.
+    pass
+
+ENVIRONMENT_KEYS = ["OPENAI_API_KEY", "OPENAI_MODEL_NAME"]
+_environment_loaded = False
+
+
+def load_environment():
+    """Sets the OpenAI settings from .env, falling back to Streamlit secrets. Runs once per process."""
+    global _environment_loaded
+    if _environment_loaded:
+        return
+    from dotenv import load_dotenv
+
+    if load_dotenv():
+        for key in ENVIRONMENT_KEYS:
+            os.environ[key] = os.getenv(key)
+    else:
+        import streamlit as st
+
+        for key in ENVIRONMENT_KEYS:
+            os.environ[key] = st.secrets[key]
+    _environment_loaded = True
+
+
+def page_imports(path):
+    """Returns the import statements at the top level of a page script, as source lines."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def profile_imports(statements, top=10):
+    """Runs `statements` in a fresh interpreter under `-X importtime`.
+
+    Returns the total import time in seconds and the `top` slowest top-level
+    modules as (module, seconds) pairs, cumulative over their own imports.
+    """
+    code = "\n".join(["import bootstrap"] + [s for s in statements if s != "import bootstrap"])
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under the module that triggered them.
+        if not name[1:].startswith(" "):
+            modules.append((name.strip(), int(cumulative) / 1e6))
+    return sum(seconds for _, seconds in modules), sorted(modules, key=lambda m: m[1], reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the cold import time of each page.")
+    parser.add_argument("pages", nargs="*", help="page scripts (default: About_Us.py and pages/*.py)")
+    parser.add_argument("--top", type=int, default=5, help="slowest modules to list per page")
+    args = parser.parse_args()
+
+    for page in args.pages or ["About_Us.py"] + sorted(glob.glob(os.path.join("pages", "*.py"))):
+        try:
+            total, slowest = profile_imports(page_imports(page), args.top)
+        except RuntimeError as e:
+            print(f"{page}: failed to import ({e})")
+            continue
+        print(f"{page}: {total:.2f}s")
+        for module, seconds in slowest:
+            print(f"    {seconds:6.2f}s  {module}")
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+import streamlit as st
+
+from resale_data import CSV_PATH
+
+try:
+    import resource
+except ImportError:  # not available on Windows; only the wall-clock timeout applies there
+    resource = None
+
+CPU_SECONDS = int(os.getenv("CHART_CPU_SECONDS", "10"))
+MEMORY_BYTES = int(os.getenv("CHART_MEMORY_MB", "512")) * 1024 * 1024
+WALL_SECONDS = int(os.getenv("CHART_WALL_SECONDS", "20"))
+# Directories generated chart code may not read from: the app's own files, .env and Streamlit secrets.
+PROTECTED_DIRS = [os.path.dirname(os.path.abspath(__file__)), os.path.join(os.path.expanduser("~"), ".streamlit")]
+
+# Runs inside the sandbox process: the generated code reads from stdin, and the
+# figure is written to stdout. `st.pyplot` is stubbed so the code's last line
+# saves the figure instead of drawing into a Streamlit page. Once matplotlib is
+# loaded, an audit hook refuses to open anything in the protected directories
+# (the app directory, bar the dataset, and the user's ~/.streamlit), so .env and
+# secrets.toml stay unreadable even by absolute path, and refuses to start
+# processes, load native libraries or open sockets.
+RUNNER = r"""
+import io, os, sys, types
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+dataset = os.path.realpath(sys.argv[2])
+protected = [os.path.realpath(d) for d in sys.argv[3:]]
+prefixes = {os.path.realpath(p) + os.sep for p in (sys.prefix, sys.base_prefix, sys.exec_prefix)}
+blocked = {"subprocess.Popen", "os.system", "os.exec", "os.posix_spawn", "os.spawn", "os.fork", "os.forkpty",
+           "socket.connect", "socket.bind", "ctypes.dlopen"}
+
+def guard(event, args):
+    if event == "open" and isinstance(args[0], (str, bytes)):
+        path = os.path.realpath(os.fsdecode(args[0]))
+        inside = any(path == d or path.startswith(d + os.sep) for d in protected)
+        # A virtualenv inside the app directory still has to be importable.
+        if inside and path != dataset and not any(path.startswith(prefix) for prefix in prefixes):
+            raise PermissionError(f"chart code may not open {args[0]}")
+    elif event in blocked:
+        raise PermissionError(f"chart code may not use {event}")
+
+sys.addaudithook(guard)
+
+captured = []
+
+def pyplot(fig=None, *args, **kwargs):
+    fig = plt.gcf() if fig is None or fig is plt else fig
+    captured.append(fig)
+
+sys.modules["streamlit"] = types.SimpleNamespace(pyplot=pyplot)
+code = sys.stdin.read()
+exec(compile(code, "<chart>", "exec"), {"__name__": "__chart__"})
+figure = captured[-1] if captured else (plt.gcf() if plt.get_fignums() else None)
+if figure is None:
+    sys.stderr.write("NoFigure: the code did not draw a figure")
+    sys.exit(3)
+buffer = io.BytesIO()
+figure.savefig(buffer, format=sys.argv[1], bbox_inches="tight")
+sys.stdout.buffer.write(buffer.getvalue())
+"""
+
+
+def extract_code(text):
+    """Returns the Python code inside a markdown fence, or the text itself if it has none."""
+    match = re.search(r"```(?:python|py)?\s*\n(.*?)```", text, re.S)
+    return (match.group(1) if match else text).strip()
+
+
+def _limit_resources():
+    resource.setrlimit(resource.RLIMIT_CPU, (CPU_SECONDS, CPU_SECONDS))
+    resource.setrlimit(resource.RLIMIT_AS, (MEMORY_BYTES, MEMORY_BYTES))
+
+
+def _failure(kind, message):
+    return {"ok": False, "image": None, "format": None, "error": {"kind": kind, "message": message}}
+
+
+def _sandbox_environment(home):
+    # Only what Python and matplotlib need, so no API keys in the environment reach the generated code.
+    # One BLAS thread keeps OpenBLAS's per-thread buffers inside the address-space limit on many-core hosts.
+    environment = {"PATH": os.environ.get("PATH", os.defpath), "MPLBACKEND": "Agg", "HOME": home, "MPLCONFIGDIR": home,
+                   "OPENBLAS_NUM_THREADS": "1", "OMP_NUM_THREADS": "1", "MKL_NUM_THREADS": "1"}
+    if os.name == "nt":
+        environment["SYSTEMROOT"] = os.environ.get("SYSTEMROOT", "")
+    return environment
+
+
+def run_sandboxed(code, image_format="png"):
+    """Executes chart code in a resource-limited subprocess and returns the figure bytes.
+
+    Returns a dict with `ok`, `image` bytes, the image `format`, and on failure
+    an `error` with a `kind` (timeout, resources, no_figure, exception) and message.
+    """
+    with tempfile.TemporaryDirectory(prefix="chart-") as home:
+        # The code runs in the empty temporary directory, where only the dataset is linked in for older code
+        # that reads it by relative path; the audit hook in RUNNER blocks the rest of the app directory.
+        if os.path.exists(CSV_PATH):
+            os.symlink(os.path.abspath(CSV_PATH), os.path.join(home, os.path.basename(CSV_PATH)))
+        try:
+            completed = subprocess.run(
+                [sys.executable, "-c", RUNNER, image_format, os.path.abspath(CSV_PATH), *PROTECTED_DIRS],
+                input=code.encode("utf-8"),
+                capture_output=True,
+                timeout=WALL_SECONDS,
+                preexec_fn=_limit_resources if resource else None,
+                env=_sandbox_environment(home),
+                cwd=home,
+            )
+        except subprocess.TimeoutExpired:
+            return _failure("timeout", f"Chart code did not finish within {WALL_SECONDS}s")
+
+    stderr = completed.stderr.decode("utf-8", "replace").strip()
+    if completed.returncode == 0:
+        return {"ok": True, "image": completed.stdout, "format": image_format, "error": None}
+    if completed.returncode == 3:
+        return _failure("no_figure", stderr)
+    if completed.returncode < 0 or "MemoryError" in stderr:
+        return _failure("resources", f"Chart code exceeded its CPU or memory limit ({stderr.splitlines()[-1] if stderr else completed.returncode})")
+    return _failure("exception", stderr.splitlines()[-1] if stderr else f"exit code {completed.returncode}")
+
+
+@st.cache_data(show_spinner=False, max_entries=500)
+def _render_cached(code_hash, image_format, _code):
+    return run_sandboxed(_code, image_format)
+
+
+def render_chart(text, image_format="png"):
+    """Renders generated chart code once per distinct code, returning the cached result afterwards."""
+    code = extract_code(text)
+    code_hash = hashlib.sha256(code.encode("utf-8")).hexdigest()
+    return _render_cached(code_hash, image_format, code)
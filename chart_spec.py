@@ -0,0 +1,127 @@
+import json
+import re
+
+import pandas as pd
+import streamlit as st
+
+FILTER_COLUMNS = ["town", "flat_type", "flat_model", "storey_range"]
+GROUP_COLUMNS = FILTER_COLUMNS + ["month", "quarter", "year"]
+CHART_TYPES = ["line", "bar", "none"]
+
+# metric name -> (source column, aggregation)
+METRICS = {
+    "count": ("resale_price", "size"),
+    "mean_price": ("resale_price", "mean"),
+    "median_price": ("resale_price", "median"),
+    "min_price": ("resale_price", "min"),
+    "max_price": ("resale_price", "max"),
+    "mean_price_per_sqm": ("price_per_sqm", "mean"),
+    "median_price_per_sqm": ("price_per_sqm", "median"),
+    "mean_floor_area_sqm": ("floor_area_sqm", "mean"),
+    "mean_remaining_lease": ("remaining_lease", "mean"),
+}
+
+SPEC_FORMAT = """{
+  "chart": "line" | "bar" | "none",
+  "title": "short chart title",
+  "group_by": ["<x-axis column>", "<optional series column>"],
+  "metric": "%s",
+  "filters": {"town": ["TAMPINES"], "flat_type": ["4 ROOM"], "flat_model": [], "storey_range": []},
+  "time_range": {"start": "YYYY-MM", "end": "YYYY-MM"}
+}
+group_by columns: %s""" % ('" | "'.join(METRICS), ", ".join(GROUP_COLUMNS))
+
+
+class ChartSpecError(ValueError):
+    """Raised when the Programmer's output is not a valid chart spec."""
+
+
+def parse_chart_spec(text):
+    """Parses and validates a chart spec from the Programmer's JSON output."""
+    match = re.search(r"\{.*\}", text, re.S)
+    if not match:
+        raise ChartSpecError("no JSON object found")
+    try:
+        spec = json.loads(match.group(0))
+    except ValueError as e:
+        raise ChartSpecError(f"invalid JSON: {e}")
+
+    chart = spec.get("chart", "line")
+    if chart not in CHART_TYPES:
+        raise ChartSpecError(f"unknown chart type {chart!r}")
+    group_by = spec.get("group_by") or []
+    if isinstance(group_by, str):
+        group_by = [group_by]
+    if chart != "none" and not 1 <= len(group_by) <= 2:
+        raise ChartSpecError("group_by needs one or two columns")
+    unknown = [column for column in group_by if column not in GROUP_COLUMNS]
+    if unknown:
+        raise ChartSpecError(f"unknown group_by columns {unknown}")
+    metric = spec.get("metric", "median_price")
+    if metric not in METRICS:
+        raise ChartSpecError(f"unknown metric {metric!r}")
+    filters = {}
+    for column, values in (spec.get("filters") or {}).items():
+        if column not in FILTER_COLUMNS:
+            raise ChartSpecError(f"cannot filter on {column!r}")
+        values = [values] if isinstance(values, str) else list(values or [])
+        if values:
+            filters[column] = [str(v).upper() for v in values]
+    time_range = spec.get("time_range") or {}
+    return {
+        "chart": chart,
+        "title": spec.get("title", ""),
+        "group_by": group_by,
+        "metric": metric,
+        "filters": filters,
+        "time_range": {"start": time_range.get("start"), "end": time_range.get("end")},
+    }
+
+
+def compute_chart_data(spec, df):
+    """Computes the chart series directly from the resale frame with one vectorized group-by.
+
+    Returns a frame indexed by the first group_by column, with one column per
+    series (or a single metric column).
+    """
+    mask = pd.Series(True, index=df.index)
+    for column, values in spec["filters"].items():
+        matching = [c for c in df[column].cat.categories if str(c).upper() in values]
+        mask &= df[column].isin(matching)
+    if spec["time_range"]["start"]:
+        mask &= df["month"] >= pd.Timestamp(spec["time_range"]["start"])
+    if spec["time_range"]["end"]:
+        mask &= df["month"] <= pd.Timestamp(spec["time_range"]["end"]) + pd.offsets.MonthEnd(0)
+
+    source, aggregation = METRICS[spec["metric"]]
+    columns = [c for c in spec["group_by"] if c in FILTER_COLUMNS] + ["month", "resale_price", "floor_area_sqm", "remaining_lease"]
+    frame = df.loc[mask, columns]
+    if frame.empty:
+        return pd.DataFrame()
+    if source == "price_per_sqm":
+        frame = frame.assign(price_per_sqm=frame["resale_price"] / frame["floor_area_sqm"])
+    if "year" in spec["group_by"]:
+        frame = frame.assign(year=frame["month"].dt.year.astype(str))
+    if "quarter" in spec["group_by"]:
+        frame = frame.assign(quarter=frame["month"].dt.to_period("Q").astype(str))
+
+    data = frame.groupby(spec["group_by"], observed=True)[source].agg(aggregation).rename(spec["metric"])
+    if len(spec["group_by"]) == 2:
+        return data.unstack(spec["group_by"][1])
+    return data.to_frame()
+
+
+def render_chart_spec(spec, df):
+    """Draws the chart described by `spec` with Streamlit's native charts. Returns False if there is no data."""
+    if spec["chart"] == "none":
+        return False
+    data = compute_chart_data(spec, df)
+    if data.empty:
+        return False
+    if spec["title"]:
+        st.caption(spec["title"])
+    if spec["chart"] == "line":
+        st.line_chart(data)
+    else:
+        st.bar_chart(data)
+    return True
@@ -0,0 +1,276 @@
+"""Nearest-comparable search over resale transactions.
+
+Blocks are placed on a map with an offline lookup table, GEOCODE_PATH, which
+maps block and street to latitude and longitude. `python comparables.py
+--geocode` fills in any blocks missing from the table using OneMap's public
+search API. Re-run it after ingesting new months and commit the table, so the
+app itself never calls out. Blocks missing from the table fall back to the
+approximate centre of their town, from the committed TOWN_CENTRES_PATH, so the
+search always runs: without the block table, distances are between town
+centres and comparables are ranked mostly by floor area, lease and recency.
+
+There are only about ten thousand HDB blocks, so distances to every block are
+one vectorized numpy expression. That is well under a millisecond, and no tree
+structure is needed.
+"""
+import argparse
+import csv
+import os
+import re
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import telemetry
+from resale_data import dataset_version, load_resale_data
+
+GEOCODE_PATH = "hdb_block_coordinates.csv"
+TOWN_CENTRES_PATH = "hdb_town_centres.csv"
+ONEMAP_SEARCH_URL = "https://www.onemap.gov.sg/api/common/elastic/search"
+MAX_RESULTS = 50
+
+# Metres per degree around Singapore (latitude ~1.35), for a flat local projection.
+METRES_PER_DEGREE_LAT = 110_574
+METRES_PER_DEGREE_LON = 111_320 * np.cos(np.radians(1.35))
+
+# Similarity weights: this many metres, sqm, years of lease or months of age count as one unit.
+DISTANCE_SCALE_M = 500
+AREA_SCALE_SQM = 10
+LEASE_SCALE_YEARS = 5
+AGE_SCALE_MONTHS = 12
+
+# The resale data abbreviates street names; user input often does not.
+STREET_ABBREVIATIONS = {
+    "AVENUE": "AVE", "STREET": "ST", "ROAD": "RD", "DRIVE": "DR", "CRESCENT": "CRES", "CLOSE": "CL",
+    "PLACE": "PL", "LORONG": "LOR", "BUKIT": "BT", "JALAN": "JLN", "TANJONG": "TG", "KAMPONG": "KG",
+    "NORTH": "NTH", "SOUTH": "STH", "UPPER": "UPP", "CENTRAL": "CTRL", "COMMONWEALTH": "C'WEALTH",
+    "GARDENS": "GDNS", "HEIGHTS": "HTS", "TERRACE": "TER", "PARK": "PK", "MARKET": "MKT",
+}
+
+
+def normalise_street(street):
+    """Upper-cases a street name and applies the abbreviations used in the resale data."""
+    words = re.sub(r"[^\w' ]", " ", str(street).upper()).split()
+    return " ".join(STREET_ABBREVIATIONS.get(word, word) for word in words)
+
+
+def block_key(block, street):
+    return f"{str(block).strip().upper()} {normalise_street(street)}"
+
+
+def parse_address(address):
+    """Splits '123A Ang Mo Kio Avenue 3' into its block ('123A') and normalised street."""
+    match = re.match(r"\s*(?:BLK|BLOCK)?\s*(\d+[A-Z]?)\s+(.+)", str(address).upper())
+    if not match:
+        return None, normalise_street(address)
+    return match.group(1), normalise_street(match.group(2))
+
+
+def _project(latitude, longitude):
+    return (np.asarray(longitude) - 103.8) * METRES_PER_DEGREE_LON, (np.asarray(latitude) - 1.35) * METRES_PER_DEGREE_LAT
+
+
+def read_geocodes(path=GEOCODE_PATH):
+    """Reads the block coordinate table into a dict of block key -> (latitude, longitude)."""
+    if not os.path.exists(path):
+        return {}
+    table = pd.read_csv(path, dtype={"block": str})
+    return {block_key(b, s): (lat, lon)
+            for b, s, lat, lon in zip(table["block"], table["street_name"], table["latitude"], table["longitude"])}
+
+
+def read_town_centres(path=TOWN_CENTRES_PATH):
+    """Reads the approximate town centres into a dict of town -> (latitude, longitude)."""
+    if not os.path.exists(path):
+        return {}
+    table = pd.read_csv(path)
+    return {town.upper(): (lat, lon) for town, lat, lon in zip(table["town"], table["latitude"], table["longitude"])}
+
+
+class ComparablesIndex:
+    """Block coordinates and per-transaction block codes for fast nearest-comparable lookups."""
+
+    def __init__(self, df, geocodes, town_centres=None):
+        self.df = df
+        streets = df["street_name"].astype(str)
+        streets = streets.map({street: normalise_street(street) for street in streets.unique()})
+        self.codes, blocks = pd.factorize(df["block"].astype(str).str.strip().str.upper() + " " + streets)
+        block_towns = df["town"].astype(str).str.upper().groupby(self.codes).first().reindex(range(len(blocks)))
+        town_centres = town_centres or {}
+        self.block_precise = np.array([key in geocodes for key in blocks], dtype=bool)
+        located = [geocodes[key] if key in geocodes else town_centres.get(town, (np.nan, np.nan))
+                   for key, town in zip(blocks, block_towns)]
+        latitude, longitude = np.array(located, dtype=float).reshape(-1, 2).T
+        self.block_latitude, self.block_longitude = latitude, longitude
+        self.block_x, self.block_y = _project(latitude, longitude)
+        self.block_index = {}
+        self.streets = {}
+        for i, key in enumerate(blocks):
+            self.block_index[key] = i
+            self.streets.setdefault(key.split(" ", 1)[-1], []).append(i)
+        self.months = df["month"].to_numpy()
+        self.flat_types = df["flat_type"]
+        self.floor_area = df["floor_area_sqm"].to_numpy(dtype=float)
+        self.lease = df["remaining_lease"].to_numpy(dtype=float)
+
+    @property
+    def coverage(self):
+        """Share of blocks placed by the block coordinate table rather than by their town's centre."""
+        return float(self.block_precise.mean()) if len(self.block_precise) else 0.0
+
+    @property
+    def located(self):
+        """Share of blocks with any coordinates, their own or their town's centre."""
+        return float(np.isfinite(self.block_x).mean()) if len(self.block_x) else 0.0
+
+    def locate(self, address):
+        """Returns the projected (x, y) of an address, using the street's centre when the block is unknown."""
+        block, street = parse_address(address)
+        i = self.block_index.get(f"{block} {street}")
+        if i is not None and np.isfinite(self.block_x[i]):
+            return self.block_x[i], self.block_y[i]
+        if street in self.streets:
+            on_street = np.asarray(self.streets[street])
+            x, y = self.block_x[on_street], self.block_y[on_street]
+            if np.isfinite(x).any():
+                return np.nanmean(x), np.nanmean(y)
+        return None
+
+    def search(self, address, flat_type=None, floor_area_sqm=None, remaining_lease=None,
+               k=10, months=24, max_distance_m=3000):
+        """Returns the `k` most similar transactions of the last `months` months within `max_distance_m`.
+
+        Similarity adds up distance, floor area, remaining lease and age of the
+        transaction, each divided by its scale. Blocks placed at their town's
+        centre have `located_by` "town". Raises ValueError for an unknown address.
+        """
+        if not self.located:
+            raise ValueError(f"no coordinates are available; check {TOWN_CENTRES_PATH} or run `python comparables.py --geocode`")
+        point = self.locate(address)
+        if point is None:
+            raise ValueError(f"cannot locate {address!r}; give a block number and street, e.g. '123 Ang Mo Kio Ave 3'")
+        block_distance = np.hypot(self.block_x - point[0], self.block_y - point[1])
+        distance = block_distance[self.codes]
+
+        latest = self.months.max()
+        age_months = (latest - self.months).astype("timedelta64[D]").astype(float) / 30.44
+        mask = (distance <= max_distance_m) & (age_months <= months)
+        if flat_type:
+            wanted = [i for i, c in enumerate(self.flat_types.cat.categories) if str(c).upper() == flat_type.strip().upper()]
+            mask &= np.isin(self.flat_types.cat.codes.to_numpy(), wanted)
+        candidates = np.flatnonzero(mask)
+
+        score = distance[candidates] / DISTANCE_SCALE_M + age_months[candidates] / AGE_SCALE_MONTHS
+        if floor_area_sqm:
+            score += np.abs(self.floor_area[candidates] - floor_area_sqm) / AREA_SCALE_SQM
+        if remaining_lease:
+            score += np.nan_to_num(np.abs(self.lease[candidates] - remaining_lease), nan=99) / LEASE_SCALE_YEARS
+        k = min(k, MAX_RESULTS, len(candidates))
+        best = candidates[np.argsort(score)[:k]] if k else candidates[:0]
+
+        result = self.df.iloc[best][["month", "town", "block", "street_name", "flat_type", "storey_range",
+                                     "floor_area_sqm", "remaining_lease", "resale_price"]].reset_index(drop=True)
+        result["month"] = result["month"].dt.strftime("%Y-%m")
+        result["distance_m"] = distance[best].round()
+        result["latitude"] = self.block_latitude[self.codes[best]]
+        result["longitude"] = self.block_longitude[self.codes[best]]
+        result["located_by"] = np.where(self.block_precise[self.codes[best]], "block", "town")
+        return result
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_index(version, geocode_mtime, _df):
+    return ComparablesIndex(_df, read_geocodes(), read_town_centres())
+
+
+def get_comparables_index():
+    """Returns the process-wide index for the loaded dataset and coordinate table."""
+    mtime = os.stat(GEOCODE_PATH).st_mtime if os.path.exists(GEOCODE_PATH) else None
+    return _load_index(dataset_version(), mtime, load_resale_data())
+
+
+def comparables_available():
+    """True when the block table or the town centres place at least one block of the dataset."""
+    return get_comparables_index().located > 0
+
+
+@telemetry.traced("comparables")
+def find_comparables(
+    address: str,
+    flat_type: Optional[str] = None,
+    floor_area_sqm: Optional[float] = None,
+    remaining_lease: Optional[float] = None,
+    k: int = 10,
+    months: int = 24,
+) -> str:
+    """Returns the k most similar recent resale transactions near an HDB address.
+
+    address: block and street, e.g. "123 Ang Mo Kio Ave 3". flat_type: e.g. "4 ROOM".
+    floor_area_sqm and remaining_lease (years) make the match closer when given.
+    months: how far back to look.
+    """
+    try:
+        result = get_comparables_index().search(address, flat_type, floor_area_sqm, remaining_lease, k, months)
+    except ValueError as e:
+        return str(e)
+    if result.empty:
+        return "No comparable transactions found near this address."
+    return result.drop(columns=["latitude", "longitude"]).round(1).to_markdown(index=False)
+
+
+@st.cache_resource(show_spinner=False)
+def comparables_tool():
+    """Wraps `find_comparables` as a structured tool for the analyst agent, shared by every request."""
+    from langchain_core.tools import StructuredTool
+
+    return StructuredTool.from_function(
+        func=find_comparables,
+        name="Find comparable transactions",
+        description=(
+            "Nearest comparable resale transactions to an HDB block address, ranked by distance, floor area, "
+            "remaining lease and recency. Use for questions about prices near a specific block or street."
+        ),
+    )
+
+
+def geocode_blocks(path=GEOCODE_PATH, pause=0.3):
+    """Looks up every block in the dataset that is missing from the coordinate table and appends it."""
+    import requests
+
+    known = read_geocodes(path)
+    df = load_resale_data()
+    blocks = df[["block", "street_name"]].astype(str).drop_duplicates()
+    missing = [(b, s) for b, s in zip(blocks["block"], blocks["street_name"]) if block_key(b, s) not in known]
+    new_file = not os.path.exists(path)
+    added = 0
+    with open(path, "a", newline="") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(["block", "street_name", "latitude", "longitude"])
+        for block, street in missing:
+            response = requests.get(ONEMAP_SEARCH_URL, timeout=10, params={
+                "searchVal": f"{block} {street}", "returnGeom": "Y", "getAddrDetails": "Y", "pageNum": 1,
+            })
+            response.raise_for_status()
+            results = [r for r in response.json().get("results", []) if r.get("BLK_NO", "").upper() == block.upper()]
+            if results:
+                writer.writerow([block, street, results[0]["LATITUDE"], results[0]["LONGITUDE"]])
+                added += 1
+            # OneMap allows about 250 requests a minute.
+            time.sleep(pause)
+    return {"missing": len(missing), "added": added}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintains the offline block coordinate table.")
+    parser.add_argument("--geocode", action="store_true", help="look up blocks missing from the table on OneMap")
+    args = parser.parse_args()
+    if args.geocode:
+        print(geocode_blocks())
+    else:
+        index = get_comparables_index()
+        print(f"{len(index.block_x)} blocks, {index.coverage:.0%} with coordinates in {GEOCODE_PATH}, "
+              f"{index.located - index.coverage:.0%} placed at their town's centre")
@@ -0,0 +1,225 @@
+import os
+
+import streamlit as st
+
+import telemetry
+from hdb_index import hdb_search_tool, search
+from semantic_cache import get_semantic_cache, normalise_question, profile_bucket
+from streaming import agent_prompts, budget_fallback, stream_llm, task_done_callback
+from task_graph import TaskGraph, run_crew_task
+
+WRITER = {
+    "role": "HDB Resale Information Writer",
+    "goal": "Write a clear and factually accurate answer to the user's question: {question}, tailored to the profile: {profile} if available.",
+    "backstory": """You're working on writing out an answer that directly addresses the question: {question} for the user with the given profile: {profile}.
+        You base your writing on the outline from the HDB Resale Content Planner and the research reports from the HDB Resale Research Analyst. When the HDB Resale Content Planner or HDB Resale Research Analyst says it is out-of-scope, you follow through and write a generic response that you are not able to answer the question.
+        Ensure the answer is structured clearly, with appropriate sections and concise points that cater to the user's specific needs and preferences.
+        Always aim to enhance the user's understanding and decision-making regarding HDB resale flats, reflecting their profile characteristics where applicable.
+        Do not include content that is not related to HDB resale, and if relevant information is missing or the question is ambiguous, provide a safe default response indicating that the question is out of scope and you are unable to answer it.
+    """,
+}
+
+TASK_WRITE = {
+    "description": """\
+        1. Use the content plan and research report to craft a concise, tailored answer to the user's question: {question} and user's profile: {profile} if the profile is given.
+        2. Ensure the answer is structured clearly, with an engaging introduction to the {question}, an insightful body containing key points that can answer the {question}, and a summarizing conclusion. The key points should be relevant to the user profile: {profile} if it is given.
+        3. Proofread for grammatical errors, and make sure that the content is safe, non-sensitive, and relevant to HDB resale flats and profile.
+        4. If it is not relevant to HDB resale flats, write a safe and generic answer, indicating that the question is out of scope, and you are not able to answer it. Do not give a response on HDB resale if the question is not relevant to HDB resale.""",
+    "expected_output": """\
+        A complete and clear answer to the user's question, tailored to their input, only if it is related to HDB resale flats.""",
+}
+
+# Bounds on the per-question research and per-question-and-bucket answer caches.
+RESEARCH_CACHE_MAX_ENTRIES = int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "200"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))
+
+PROGRESS_LABELS = {
+    "HDB Resale Content Planner": "Planner done: answer outline ready",
+    "HDB Resale Research Analyst": "Research done: HDB information gathered",
+}
+
+
+def _planner_and_researcher():
+    """Builds the planner and researcher agents and their tasks, templated on {question} and {profile}.
+
+    CrewAI keeps per-run state on agents and tasks, so each request builds its own.
+    """
+    from crewai import Agent, Task
+
+    tool_websearch = hdb_search_tool()
+
+    agent_planner = Agent(
+        role="HDB Resale Content Planner",
+        goal="Plan a structured, concise, and factually accurate answer based on the question: {question}, if it is related to HDB resale flats, tailored to the profile: {profile} if available.",
+        backstory="""You're working on planning a response that could answer the question: {question}, if it is on HDB resale housing. 
+        Focus solely on information directly related to HDB resale flats that aids potential HDB resale property buyers. 
+        Consider the user profile: {profile} to tailor the response more effectively, addressing their specific needs and preferences. 
+        Do not attempt to plan responses for questions unrelated to HDB resale flats.
+        If the question includes irrelevant content, plan a safe and general response, indicating that the question is out of scope and you cannot answer it. You do not have to plan any information on HDB resale information if the question is irrelevant to HDB resale.
+        Aim to format the planned response in a clear structure, with key points highlighted for easy understanding.
+        """,
+        allow_delegation=False,
+        verbose=True,
+    )
+
+    agent_researcher = Agent(
+        role="HDB Resale Research Analyst",
+        goal="Conduct in-depth research on public, non-sensitive HDB resale information that can answer the question: {question}, if it is related to HDB resale flats, tailored to the profile: {profile} if available.",
+        backstory="""You're working on conducting in-depth research on the question {question} that should be on HDB resale units.
+        You have access to a search tool over an index of the HDB website to gather only necessary information on HDB resale flats, while considering the user profile: {profile} to tailor the research effectively.
+        You are responsible for providing accurate, safe, and specific HDB resale flat answers, and nothing else.
+        Always aim to present insights relevant to the user's profile, if given, to enhance the value of the research output.
+        If the question is not related to HDB resale flats or includes harmful content, do not attempt to gather other information.
+        """,
+        allow_delegation=False,
+        verbose=True,
+    )
+
+    task_plan = Task(
+        description="""\
+        1. Understand the user's {question} and identify key aspects specific to HDB resale flats.
+        2. Identify points that can target the question.
+        3. Develop a detailed content outline, including an introduction to the topic of the given question and key points that answer the question if it is related to HDB resale housing.
+        4. Refine according to user's profile : {profile} if given
+        5. Otherwise, provide a default response if the question is irrelevant, indicating that the question is out of scope, and you are not able to answer it. Do not attempt to force a connection between the user's question and HDB resale flats if they are not related.""",
+        expected_output="""\
+        A comprehensive plan document with an outline, including key aspects to cover and the structure of the response.""",
+        agent=agent_planner,
+    )
+
+    task_research = Task(
+        description="""\
+        1. Conduct in-depth research on the specific question: {question} asked by the user, if it pertains to HDB resale flats.
+        2. Provide the HDB Resale Content Planner with up-to-date information and key points directly related to the HDB resale flat question. The points should be as specific as possible to user's profile: {profile} if given
+        3. Offer additional insights and resources to support the content plan, but focus strictly on the HDB resale flat question and the profile, avoiding unrelated topics.
+        4. Do not attempt to force a connection between the user's question and HDB resale flats if they are not related. If the question is irrelevant, indicate that the question is out of scope, and you are not able to answer it.""",
+        expected_output="""\
+        A research report with the latest, accurate information relevant to HDB resale flats and user profile, answering the user's question if it is related to HDB resale housing.""",
+        agent=agent_researcher,
+        tools=[tool_websearch],
+    )
+    return agent_planner, agent_researcher, task_plan, task_research
+
+
+# Planning and research are done once per question for any buyer; only the writer sees the profile.
+GENERIC_PROFILE = "not given; cover what applies to buyers of different ages, incomes and marital statuses"
+
+
+@st.cache_data(show_spinner=False, max_entries=RESEARCH_CACHE_MAX_ENTRIES)
+def research_question(key, _question, _on_event=None):
+    """Plans and researches `_question` for any buyer, cached on its normalised form `key`.
+
+    Returns the plan, the research report and their timings.
+    """
+    agent_planner, agent_researcher, task_plan, task_research = _planner_and_researcher()
+    callback = task_done_callback(_on_event, PROGRESS_LABELS)
+    inputs = {"question": _question, "profile": GENERIC_PROFILE}
+
+    # Planning and research are independent, so they run in parallel.
+    graph = TaskGraph()
+    graph.add("plan", lambda outputs: run_crew_task(agent_planner, task_plan, inputs, callback))
+    graph.add("research", lambda outputs: run_crew_task(agent_researcher, task_research, inputs, callback))
+    outputs, timings = graph.run()
+    return {"plan": outputs["plan"], "research": outputs["research"], "timings": timings}
+
+
+@st.cache_data(show_spinner=False, max_entries=ANSWER_CACHE_MAX_ENTRIES)
+def _personalised_answer(question, bucket, mode, _on_event=None, _on_token=None):
+    telemetry.mark_cache_miss()
+    inputs = {"question": question, "profile": bucket}
+
+    def research(outputs):
+        if mode == "definition":
+            return {"plan": "", "research": search(question)}
+        return research_question(normalise_question(question), question, _on_event=_on_event)
+
+    def write(outputs):
+        if _on_event:
+            _on_event("Writing your answer...")
+        context = [outputs["research"][name] for name in ("plan", "research") if outputs["research"][name]]
+        prompts = agent_prompts(WRITER, TASK_WRITE, inputs, context)
+        return stream_llm(*prompts, on_token=_on_token)
+
+    graph = TaskGraph()
+    graph.add("research", research)
+    graph.add("write", write, depends_on=["research"])
+    outputs, timings = graph.run()
+    # The plan and research are already cached by `research_question`; only the answer is kept here.
+    return {"answer": outputs["write"], "timings": timings, "degraded": []}
+
+
+def question_ai(question, profile, mode="full", _on_event=None, _on_token=None):
+    """Answers a question for a profile: shared planning and research, then a personalised writer.
+
+    The plan and research are cached per question, and the answer per
+    question and profile bucket (the age, income and marital status bands that
+    change HDB eligibility), so a repeat question from a similar profile costs
+    nothing, and from a different one a single writer call.
+    In "definition" mode the planner and researcher agents are skipped: the
+    writer works straight from the HDB index passages matching the question.
+    `_on_event` receives progress messages and `_on_token` the writer's tokens;
+    a cached answer is returned as is.
+
+    If the request runs out of time or tokens, the answer is the writer's
+    partial text or else the nearest previously cached answer, and is listed
+    as degraded. Only when neither exists is BudgetExceeded raised.
+    """
+    try:
+        return _personalised_answer(question, profile_bucket(profile), mode, _on_event=_on_event, _on_token=_on_token)
+    except telemetry.BudgetExceeded as e:
+        nearest = None if e.partial else get_semantic_cache().nearest(question, profile)
+        if not (e.partial or nearest):
+            raise
+        telemetry.record_degraded("write", e.reason)
+        return {"answer": budget_fallback(e, nearest), "timings": {}, "degraded": ["write"]}
+
+
+def format_sections(answers):
+    """Joins (question, answer) pairs into one answer with a numbered section per question."""
+    return "\n\n".join(f"### {i}. {question}\n\n{answer}" for i, (question, answer) in enumerate(answers, 1))
+
+
+def batch_question_ai(questions, profile, _on_event=None, _on_token=None):
+    """Answers several questions for one profile with a single plan and a single research run.
+
+    The planner and researcher see all the questions at once. Each question
+    then gets its own writer call for the profile bucket, and those calls run
+    concurrently. Writers run in parallel, so their tokens are not streamed;
+    `_on_event` reports each finished answer. Answers are cached per question
+    by the caller, so the batch itself is not. A writer that runs out of time
+    or tokens falls back to its partial text or the research, and its question
+    is listed in `degraded`.
+    """
+    telemetry.mark_cache_miss()
+    bucket = profile_bucket(profile)
+    agent_planner, agent_researcher, task_plan, task_research = _planner_and_researcher()
+    callback = task_done_callback(_on_event, PROGRESS_LABELS)
+    listed = "\n".join(f"{i}. {question}" for i, question in enumerate(questions, 1))
+    inputs = {"question": listed, "profile": GENERIC_PROFILE}
+
+    def write(question):
+        def run(outputs):
+            prompts = agent_prompts(WRITER, TASK_WRITE, {"question": question, "profile": bucket},
+                                    [outputs["plan"], outputs["research"]])
+            answer = stream_llm(*prompts)
+            if _on_event:
+                _on_event(f"Answered: {question}")
+            return answer
+        return run
+
+    graph = TaskGraph()
+    graph.add("plan", lambda outputs: run_crew_task(agent_planner, task_plan, inputs, callback))
+    graph.add("research", lambda outputs: run_crew_task(agent_researcher, task_research, inputs, callback))
+    for i, question in enumerate(questions):
+        graph.add(f"write_{i}", write(question), depends_on=["plan", "research"],
+                  fallback=lambda outputs, error: budget_fallback(error, outputs["research"]))
+    outputs, timings = graph.run(max_workers=max(4, len(questions)))
+    answers = [(question, outputs[f"write_{i}"]) for i, question in enumerate(questions)]
+    return {
+        "plan": outputs["plan"],
+        "research": outputs["research"],
+        "answers": answers,
+        "answer": format_sections(answers),
+        "timings": timings,
+        "degraded": [question for i, question in enumerate(questions) if timings[f"write_{i}"]["degraded"]],
+    }
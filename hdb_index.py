@@ -0,0 +1,165 @@
+"""Offline index of HDB website pages for the Personalised Guide's researcher.
+
+Run `python hdb_index.py` to crawl HDB_PAGES (or `--fixtures DIR` to index
+local .html files instead) into a persistent Chroma collection under db/.
+Only chunks whose content hash changed since the last run are re-embedded.
+"""
+import argparse
+import glob
+import hashlib
+import os
+
+import streamlit as st
+
+import telemetry
+
+INDEX_PATH = "db"
+COLLECTION_NAME = "hdb_infoweb"
+EMBEDDING_MODEL = os.getenv("HDB_INDEX_EMBEDDING_MODEL", "text-embedding-3-small")
+CHUNK_SIZE = 1200
+
+HDB_PAGES = [
+    "https://www.hdb.gov.sg/cs/infoweb",
+    "https://www.hdb.gov.sg/residential/buying-a-flat/buying-procedure-for-resale-flats",
+    "https://www.hdb.gov.sg/residential/buying-a-flat/understanding-your-eligibility-and-housing-loan-options/flat-and-grant-eligibility",
+    "https://www.hdb.gov.sg/residential/buying-a-flat/understanding-your-eligibility-and-housing-loan-options/housing-loan-options",
+    "https://www.hdb.gov.sg/residential/buying-a-flat/finding-a-flat/resale-flat-prices",
+    "https://www.hdb.gov.sg/residential/buying-a-flat/conditions-after-buying",
+]
+
+
+def _embedding_function():
+    from chromadb.utils import embedding_functions
+
+    return embedding_functions.OpenAIEmbeddingFunction(
+        api_key=os.environ["OPENAI_API_KEY"], model_name=EMBEDDING_MODEL
+    )
+
+
+def get_collection(create=False):
+    """Opens the HDB page collection, creating it only when `create` is set."""
+    import chromadb
+
+    client = chromadb.PersistentClient(path=INDEX_PATH)
+    if create:
+        return client.get_or_create_collection(COLLECTION_NAME, embedding_function=_embedding_function())
+    return client.get_collection(COLLECTION_NAME, embedding_function=_embedding_function())
+
+
+def html_to_text(html):
+    """Extracts the readable text of a page, dropping scripts, styles and navigation."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "noscript", "nav", "header", "footer", "form"]):
+        tag.decompose()
+    lines = (line.strip() for line in soup.get_text("\n").splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def chunk_text(text, size=CHUNK_SIZE):
+    """Splits text into chunks of roughly `size` characters on line boundaries."""
+    chunks, current = [], ""
+    for line in text.splitlines():
+        if current and len(current) + len(line) > size:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def fetch_pages(urls):
+    """Yields (url, html) for each configured HDB page."""
+    import requests
+
+    for url in urls:
+        response = requests.get(url, timeout=30, headers={"User-Agent": "hdb-resale-guide-indexer"})
+        response.raise_for_status()
+        yield url, response.text
+
+
+def read_fixture_pages(directory):
+    """Yields (url, html) for each .html file in a local fixture directory."""
+    for path in sorted(glob.glob(os.path.join(directory, "**", "*.html"), recursive=True)):
+        with open(path, encoding="utf-8") as f:
+            yield "file://" + os.path.abspath(path), f.read()
+
+
+def ingest(pages, collection=None):
+    """Indexes (url, html) pairs, embedding only chunks that are new or changed."""
+    collection = collection or get_collection(create=True)
+    summary = {"pages": 0, "added": 0, "removed": 0, "unchanged": 0}
+    for url, html in pages:
+        summary["pages"] += 1
+        url_key = _sha256(url)[:16]
+        chunks = {f"{url_key}:{_sha256(chunk)[:32]}": chunk for chunk in chunk_text(html_to_text(html))}
+        existing = set(collection.get(where={"url": url}, include=[])["ids"])
+
+        new_ids = [chunk_id for chunk_id in chunks if chunk_id not in existing]
+        stale_ids = list(existing - set(chunks))
+        if new_ids:
+            collection.upsert(
+                ids=new_ids,
+                documents=[chunks[chunk_id] for chunk_id in new_ids],
+                metadatas=[{"url": url} for _ in new_ids],
+            )
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+        summary["added"] += len(new_ids)
+        summary["removed"] += len(stale_ids)
+        summary["unchanged"] += len(chunks) - len(new_ids)
+    return summary
+
+
+@st.cache_resource(show_spinner=False)
+def _read_only_collection():
+    return get_collection(create=False)
+
+
+@telemetry.traced("hdb_search")
+def search(query, n_results=5):
+    """Returns the indexed HDB passages most relevant to `query`, with their source pages."""
+    result = _read_only_collection().query(query_texts=[query], n_results=n_results)
+    passages = []
+    for document, metadata in zip(result["documents"][0], result["metadatas"][0]):
+        passages.append(f"Source: {metadata['url']}\n{document}")
+    return "\n\n---\n\n".join(passages) or "No indexed HDB content matches this query."
+
+
+@st.cache_resource(show_spinner=False)
+def hdb_search_tool():
+    """Returns the process-wide read-only retrieval tool over the pre-built HDB website index."""
+    from crewai_tools import tool
+
+    @tool("Search the HDB website")
+    def search_hdb_website(query: str) -> str:
+        """Searches an index of official HDB website pages (www.hdb.gov.sg) and returns the most relevant passages with their source URLs."""
+        return search(query)
+
+    return search_hdb_website
+
+
+if __name__ == "__main__":
+    import bootstrap  # swaps in pysqlite3 for Chroma
+
+    parser = argparse.ArgumentParser(description="Build or refresh the HDB website index.")
+    parser.add_argument("--fixtures", help="index .html files from this directory instead of crawling")
+    parser.add_argument("--pages", help="file with one URL per line, replacing the default HDB_PAGES")
+    args = parser.parse_args()
+
+    bootstrap.load_environment()
+    if args.fixtures:
+        source = read_fixture_pages(args.fixtures)
+    else:
+        urls = HDB_PAGES
+        if args.pages:
+            with open(args.pages) as f:
+                urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        source = fetch_pages(urls)
+    print(ingest(source))
@@ -0,0 +1,227 @@
+import argparse
+import functools
+import hashlib
+import inspect
+import json
+import os
+
+import telemetry
+from aggregates import cube_tool
+from chart_spec import SPEC_FORMAT
+from comparables import comparables_available, comparables_tool
+from query_dsl import query_tool
+from result_cache import get_result_cache
+from streaming import agent_prompts, budget_fallback, stream_llm, task_done_callback
+from task_graph import TaskGraph, run_crew_task
+from trends import trends_tool
+
+WRITER = {
+    "role": "Content Writer",
+    "goal": "Write a clear and factually accurate answer to the user's topic: {topic} based on data, if the topic is on HDB resale housing",
+    "backstory": """You're working on writing a summary report that contains statistics and insights about the topic: {topic}, if the topic is on HDB resale housing.
+        You base your writing on the statistics and insights of the Content Analyst, who provides the values calculated for the topic.
+        You follow the main objectives and direction of the outline as provided by the Content Planner.
+        You always strive to communicate in a clear, concise manner, adhering to best practices in data analysis reporting.
+        Avoid including any content that is not related to HDB resale property, and if relevant information is missing or the question is ambiguous, provide a safe default response indicating that the question is out of scope and you are unable to answer it.
+    """,
+}
+
+TASK_WRITE = {
+    "description": """\
+        1. If the Content Planner gave a outline of a safe and generic response or the Content Analyst gave no analysis, provide a safe and generic response
+        2. Otherwise, develop a comprehensive report based on the analysis and insights gained, that directly addresses the topic: {topic},  only if it is related to HDB resale flats
+        3. Sections/Subtitles are properly named in an engaging manner.
+        4. Ensure the post is structured with an engaging introduction, insightful body, and a summarizing conclusion.
+        5. Proofread for grammatical error.
+    """,
+    "expected_output": """\
+        A well-written report that presents the insights the user is interested in.
+        """,
+}
+
+PROGRESS_LABELS = {
+    "Content Planner": "Planner done: key aspects identified",
+    "Content Analyst": "Analyst done: statistics gathered",
+    "Programmer": "Programmer done: chart specified",
+}
+
+
+def run_insights(topic, on_event=None, on_token=None):
+    """Runs the insights task graph: plan, then analyse, then the streamed report and the chart spec in parallel.
+
+    `on_event` receives progress messages and `on_token` the writer's tokens.
+    """
+    from crewai import Agent, Task
+
+    telemetry.mark_cache_miss()
+    statistics_tool = cube_tool()
+    data_query_tool = query_tool()
+    # Without any coordinates (block table or town centres) the comparables tool could only fail, so it is left out.
+    nearby_tools = [comparables_tool()] if comparables_available() else []
+    price_trend_tool = trends_tool()
+
+    agent_planner = Agent(
+        role = "Content Planner",
+        goal = "Extract key features of the topic: {topic}",
+        backstory = """ You're working on extracting key aspects of the topic: {topic}, if the topic is on HDB resale housing statistics. 
+        You collect information that is helpful for analysis and generating concise written content. 
+        Your work is the basis for the Content Analyst to filter the dataset for analysis purpose, for the Content Writer to write a concise answer, and for the Programmer to code out a visulisation on the topic.
+        If the topic is irrelevant to the HDB resale housing statistics, ambiguous, or contains harmful content, plan a safe and general response, indicating that the question is out of scope and you cannot answer it. 
+        Do not attempt to create an outline for topics that are not related to HDB resale property.
+        """,
+        allow_delegation=False,
+        verbose=True,
+    )
+
+    agent_data_analyst = Agent(
+        role="Content Analyst",
+        goal="Analyze the data based on the topic: {topic}",
+        backstory="""You're the best data analyst. You will work on gathering insights that can answer the topic: {topic}, only if the topic is related to HDB resale housing.
+        You base your analysis on the key aspects from the Content Planner.
+        Your work is the basis for the Programmer to create suitable visualisations on the topic, and for the Content Writer to write out a data-driven response that could answer the topic.
+        Aim to present the statistics in a mannner the Programmer can retrieve to generate python graph visualisations. 
+        You have access to a precomputed statistics tool for counts, means, medians and percentiles by town, flat type, storey range and month; use it first. Use the query tool for anything it cannot answer, such as filtering by flat model, floor area, remaining lease or street. For prices near a specific block, use the comparables tool if you have it. For how prices have moved or will move, use the trends tool, which has rolling medians, year-on-year changes, a price index and a forecast for every town and flat type. Focus solely on information that can be obtained from the data. Remember that this data contain HDB resale statistics and nothing else.
+        Do not attempt to modify the data or search for insights that are irrelevant to the data context or HDB resale property. Always respect user privacy.
+
+        """,
+        allow_delegation=False,
+        verbose=True,
+        tools=[statistics_tool, data_query_tool, price_trend_tool] + nearby_tools,
+    )
+
+    agent_programmer = Agent(
+        role="Programmer",
+        goal="Specify a chart that visualises the topic: {topic}",
+        backstory="""You're the top-notch data visualisation specialist who knows the HDB resale dataset well.
+        Based on the key aspects extracted by the Content Planner and information gathered by the Content Analyst, you describe the chart that could show an appropriate visualisation to enhance the answer given to the user's question: {topic}.
+        You do not write code or copy numbers: the application computes every value of the chart from the dataset using your specification.
+        Focus solely on the instructions given by Content Planner and information gathered by the Content Analyst. 
+        You ignore any content not related to HDB resale property.
+        """,
+        allow_delegation=False,
+        verbose=True, 
+    )
+
+    task_plan = Task(
+        description ="""\
+        1. Understand the topic: {topic}.
+        2. Verify the topic is relevant to HDB resale housing statistics.
+        3. If it relevant, identify key aspects of the topic that needs to be answered, that can be used to guide the direction of an analysis, report writing and python codes for visualisations.
+        4. If the topic is irrelevant to the HDB resale housing statistics, ambiguous, or contains harmful content, plan a safe and general response, indicating that the question is out of scope and you cannot answer it. 
+        5. Do not force a connection between the topic and HDB resale housing.
+        """,
+        expected_output="""\
+        A list of key aspects on the topic if topic is relevant to HDB resale housing statistics, otherwise a plan on a safe and general response.""",
+
+        agent=agent_planner,
+    )
+
+
+    task_analyze = Task(
+        description="""\
+        1. If the Content Planner gave a outline of a safe and generic response, do not attempt to query or analyse the data. 
+        2. Otherwise, verify if the key aspects aligns with the dataset's contents. The dataset is only on HDB resale statistics.
+        3. If it is relevant, use the tool to analyze the data based on the user query. If no data can be obtained, you may attempt to generalize the key aspects by identifying broader trends or related aspects, and then try to obtain the data again. If there is still no data, provide a generic response indicating that there is insufficient data to answer the topic. Always ensure that your responses are grounded in actual data; do not attempt to generate data that is non-existent.
+        4. Develop key points covering the insights and statistics, prioritising readability for the Programmer.
+        5. If the topic is irrelevant to the data, ambiguous, or contains harmful content, do not proceed with the analysis. 
+        6. Do not force a connection between the topic and the dataset. The dataset only contains HDB resale property statistics.
+        """,
+        expected_output="""\
+        Key statistics that can answer the topic if it is relevant and appropriate""",
+
+        agent=agent_data_analyst,
+        context= [task_plan],
+    )
+
+    task_code = Task(
+        description="""\
+        1. If the Content Planner provided a generic response or there is no analysis from the Content Analyst, set "chart" to "none".
+        2. Otherwise, understand the user request on the topic: {topic} given by the Content Planner.
+        3. Choose the chart type, the columns to group by (x-axis first, then an optional series), the metric, the filters and the time range that show the statistics found by the Content Analyst.
+        4. Use only the dataset's own values for filters, in upper case, e.g. "TAMPINES", "4 ROOM", "10 TO 12". Do not include any statistics or sample data.
+        5. Reply with a single JSON object in this format:
+        """ + SPEC_FORMAT.replace("{", "{{").replace("}", "}}"),
+
+        expected_output="""\
+        A single JSON chart specification. Only include the JSON object, do not include any text.
+        """,
+
+        agent=agent_programmer,
+        context = [task_plan, task_analyze],
+    )
+
+    callback = task_done_callback(on_event, PROGRESS_LABELS)
+    inputs = {"topic": topic}
+
+    def write(outputs):
+        if on_event:
+            on_event("Writing the report...")
+        prompts = agent_prompts(WRITER, TASK_WRITE, inputs, [outputs["plan"], outputs["analyze"]])
+        return stream_llm(*prompts, on_token=on_token)
+
+    # The writer and the programmer only need the plan and the analysis, so they run concurrently.
+    graph = TaskGraph()
+    graph.add("plan", lambda outputs: run_crew_task(agent_planner, task_plan, inputs, callback))
+    graph.add("analyze", lambda outputs: run_crew_task(agent_data_analyst, task_analyze, inputs, callback), depends_on=["plan"])
+    # Out of time or tokens, the report falls back to the analyst's statistics and the chart is dropped.
+    graph.add("write", write, depends_on=["plan", "analyze"],
+              fallback=lambda outputs, error: budget_fallback(error, outputs["analyze"], "report"))
+    graph.add("code", lambda outputs: run_crew_task(agent_programmer, task_code, inputs, callback), depends_on=["plan", "analyze"],
+              fallback=lambda outputs, error: "")
+    outputs, timings = graph.run()
+    return {
+        "plan": outputs["plan"],
+        "analysis": outputs["analyze"],
+        "report": outputs["write"],
+        "chart": outputs["code"],
+        "timings": timings,
+        "degraded": [name for name, timing in timings.items() if timing["degraded"]],
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def _source_hash():
+    """Fingerprints the agents and prompts, which only change with the code."""
+    config = [inspect.getsource(run_insights), WRITER, TASK_WRITE, SPEC_FORMAT]
+    return hashlib.sha256(json.dumps(config).encode()).hexdigest()
+
+
+def config_hash():
+    """Fingerprints the agents, prompts, model and tools, so cached answers are dropped when any of them change."""
+    config = [_source_hash(), os.getenv("OPENAI_MODEL_NAME", ""), comparables_available()]
+    return hashlib.sha256(json.dumps(config).encode()).hexdigest()[:12]
+
+
+def data_ai(topic, version, _on_event=None, _on_token=None):
+    """Returns the Insights answer for `topic` on dataset `version`, from the result cache when possible.
+
+    A cached result is returned as is, without progress events or streamed tokens.
+    Results degraded by the request's time or token budget are not cached.
+    """
+    cache = get_result_cache()
+    result = cache.get(topic, version, config_hash())
+    if result is None:
+        result = run_insights(topic, _on_event, _on_token)
+        if not result["degraded"]:
+            cache.put(topic, version, config_hash(), result)
+    return result
+
+
+if __name__ == "__main__":
+    import bootstrap  # swaps in pysqlite3 for Chroma
+
+    parser = argparse.ArgumentParser(description="Pre-computes Insights answers for popular questions.")
+    parser.add_argument("topics", help="file with one question per line")
+    args = parser.parse_args()
+
+    from resale_data import dataset_version
+
+    bootstrap.load_environment()
+    with open(args.topics) as f:
+        topics = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    version = dataset_version()
+    for topic in topics:
+        cached = get_result_cache().get(topic, version, config_hash()) is not None
+        if not cached:
+            telemetry.instrument("insights", data_ai)(topic, version)
+        print(f"{'cached' if cached else 'computed'}: {topic}")
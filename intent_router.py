@@ -0,0 +1,94 @@
+"""Keyword rules run before any LLM call to decide whether and how a question is answered.
+
+`route` rejects greetings and questions that are clearly about something
+else, points questions at the page that can answer them, and marks short
+definitional Guide questions so they skip the planner and researcher agents.
+Questions the rules do not recognise are answered: the planner agents already
+decline out-of-scope topics, and a keyword list cannot cover every valid question.
+"""
+import re
+
+GREETING = re.compile(
+    r"^(hi|hello|hey|yo|good (morning|afternoon|evening)|thanks?( you)?|thank you|ok(ay)?|bye|test(ing)?)\b[\s!.?]*$"
+)
+
+HOUSING_TERMS = re.compile(
+    r"\b(hdb|resale|flats?|bto|housing|homes?|house|apartments?|properties|property|[2-5][ -]?room|executive|"
+    r"maisonettes?|jumbo|storey|floor area|sqm|psf|lease|grants?|cpf|loans?|mortgage|ltv|msr|tdsr|mop|"
+    r"minimum occupation|eligib\w*|hfe|option to purchase|otp|valuation|cov|ethnic integration|eip|spr quota|"
+    r"downpayment|down payment|stamp duty|buyers?|sellers?|town|estate|neighbou?rhood|block)\b"
+)
+
+TOWNS = re.compile(
+    r"\b(ang mo kio|bedok|bishan|bukit batok|bukit merah|bukit panjang|bukit timah|central area|choa chu kang|"
+    r"clementi|geylang|hougang|jurong east|jurong west|kallang|whampoa|marine parade|pasir ris|punggol|"
+    r"queenstown|sembawang|sengkang|serangoon|tampines|toa payoh|woodlands|yishun)\b"
+)
+
+# Clear signals of a question about something other than housing; only rejected when no housing term appears.
+OFF_TOPIC = re.compile(
+    r"\b(weather|recipes?|cook(ing)?|jokes?|poems?|song|lyrics|movies?|films?|football|soccer|nba|sports?|"
+    r"stocks?|crypto\w*|bitcoin|horoscope|celebrit\w*|translate|essay|homework|python|javascript|code|"
+    r"capital of|president|prime minister)\b"
+)
+
+# Questions about what happened in past transactions: the Insights page's dataset.
+INSIGHTS_TERMS = re.compile(
+    r"\b(median|average|mean|trends?|transactions?|sold|statistics?|stats|historical|past|over the years|"
+    r"year[- ]on[- ]year|yoy|per sqm|psf|price per|highest|lowest|cheapest|most expensive|how many|"
+    r"distribution|breakdown|chart|graph|plot|20(1[7-9]|2\d))\b"
+)
+
+# Questions about rules, money and the buying process: the Guide page's HDB website index.
+GUIDE_TERMS = re.compile(
+    r"\b(eligib\w*|grants?|cpf|loans?|mortgage|ltv|msr|tdsr|mop|minimum occupation|hfe|procedure|process|steps?|"
+    r"apply|application|option to purchase|otp|cov|ethnic integration|eip|spr|singles?|married|fianc\w*|"
+    r"income ceiling|downpayment|down payment|stamp duty|valuation|afford\w*|borrow\w*|couples?)\b"
+)
+
+DEFINITION = re.compile(r"^(what is|what are|what's|whats|what does .+ (mean|stand for)|define|meaning of)\b")
+PERSONAL = re.compile(r"\b(i|i'm|im|me|my|we|our|us)\b")
+MAX_DEFINITION_WORDS = 12
+
+PAGES = {
+    "guide": ("pages/2_Personalised_HDB_Resale_Property_Guide.py", "Personalised HDB Resale Property Guide"),
+    "insights": ("pages/3_Historical_HDB_Resale_Insights.py", "Historical HDB Resale Insights"),
+}
+
+
+def _normalise(text):
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def route(text, page):
+    """Classifies a question asked on `page` ("guide" or "insights").
+
+    Returns a dict with `action` ("answer", "reject" or "redirect"), the
+    `message` to show when not answering, the `page` that should answer it and,
+    for the Guide, the pipeline `mode` ("full", or "definition" for the reduced crew).
+    """
+    question = _normalise(text)
+    if GREETING.match(question):
+        return {"action": "reject", "page": page, "mode": None,
+                "message": "Hello! Please ask a question about HDB resale flats."}
+    if OFF_TOPIC.search(question) and not (HOUSING_TERMS.search(question) or TOWNS.search(question)):
+        return {"action": "reject", "page": page, "mode": None,
+                "message": "Sorry, this question does not appear to be about HDB resale flats, so it cannot be answered here."}
+
+    insights, guide = len(INSIGHTS_TERMS.findall(question)), len(GUIDE_TERMS.findall(question))
+    # Only redirect on a clear signal; mixed questions stay where they were asked.
+    target = page
+    if page == "guide" and insights and not guide:
+        target = "insights"
+    elif page == "insights" and guide and not insights:
+        target = "guide"
+    if target != page:
+        return {"action": "redirect", "page": target, "mode": None,
+                "message": f"This looks like a question for the {PAGES[target][1]} page."}
+
+    mode = None
+    if page == "guide":
+        definitional = (DEFINITION.match(question) and not PERSONAL.search(question)
+                        and len(question.split()) <= MAX_DEFINITION_WORDS)
+        mode = "definition" if definitional else "full"
+    return {"action": "answer", "page": page, "mode": mode, "message": None}
@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", "4"))
+MAX_JOBS_PER_USER = int(os.getenv("JOB_MAX_PER_USER", "1"))
+RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+
+class JobLimitError(Exception):
+    """Raised when a user already has the maximum number of jobs in flight."""
+
+
+class Job:
+    """One crew execution: its progress events, streamed text and final result."""
+
+    def __init__(self, key, owner, meta):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.owner = owner
+        self.meta = meta
+        self.status = "queued"
+        self.events = []
+        self.text = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        # Identical requests share a job, so each user following it keeps their own context here.
+        self.viewers = {}
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    def on_event(self, message):
+        self.events.append(message)
+
+    def on_token(self, token):
+        self.text += token
+
+
+class JobQueue:
+    """Runs crews on a bounded worker pool, deduplicating identical in-flight requests."""
+
+    def __init__(self, max_workers=MAX_WORKERS, max_jobs_per_user=MAX_JOBS_PER_USER):
+        self.max_jobs_per_user = max_jobs_per_user
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crew-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._in_flight = {}
+
+    def submit(self, key, owner, fn, *args, meta=None):
+        """Queues `fn(*args)` and returns its job id, or the id of an identical job already in flight.
+
+        `fn` is called with `_on_event` and `_on_token` keyword arguments that
+        feed the job's progress events and streamed text.
+        """
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(self._in_flight.get(key))
+            if job and not job.done:
+                return job.id
+            active = sum(1 for j in self._jobs.values() if j.owner == owner and not j.done)
+            if active >= self.max_jobs_per_user:
+                raise JobLimitError("Please wait for your current question to finish before asking another.")
+            job = Job(key, owner, meta or {})
+            self._jobs[job.id] = job
+            self._in_flight[key] = job.id
+        self._executor.submit(self._run, job, fn, args)
+        return job.id
+
+    def _run(self, job, fn, args):
+        job.status = "running"
+        try:
+            job.result = fn(*args, _on_event=job.on_event, _on_token=job.on_token)
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e) or e.__class__.__name__
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._in_flight.get(job.key) == job.id:
+                    del self._in_flight[job.key]
+
+    def _expire(self):
+        cutoff = time.time() - RETENTION_SECONDS
+        for job_id in [j.id for j in self._jobs.values() if j.done and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Returns the job with this id, or None if it is unknown or expired."""
+        return self._jobs.get(job_id)
+
+    def position(self, job):
+        """Returns how many queued jobs were submitted before this one."""
+        return sum(1 for j in list(self._jobs.values()) if j.status == "queued" and j.created_at < job.created_at)
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_queue():
+    """Returns the process-wide job queue."""
+    return JobQueue()
+
+
+def current_user():
+    """Identifies the submitting user by an id kept in session state across pages
+    and in the URL across refreshes, so a refresh does not lift the per-user job limit.
+
+    A tab opened on the bare page URL counts as a new user.
+    """
+    ctx = get_script_run_ctx()
+    if not ctx:
+        return "anonymous"
+    user = st.session_state.get("user_id") or st.query_params.get("user_id") or ctx.session_id
+    st.session_state["user_id"] = user
+    if st.query_params.get("user_id") != user:
+        st.query_params["user_id"] = user
+    return user
+
+
+def attached_job(name):
+    """Returns the job a page follows under `name`, kept in session state across
+    reruns and in the URL across refreshes, or None."""
+    job_id = st.session_state.get(name) or st.query_params.get(name)
+    job = get_job_queue().get(job_id) if job_id else None
+    if job_id and job is None:
+        detach_job(name)
+    return job
+
+
+def attach_job(name, job_id, context=None):
+    """Makes the page follow `job_id` under `name` across reruns and page refreshes.
+
+    `context` is kept on the job for the current user until it expires; read it back with `job_context`.
+    """
+    st.session_state[name] = job_id
+    st.query_params[name] = job_id
+    job = get_job_queue().get(job_id)
+    if job and context is not None:
+        job.viewers[current_user()] = context
+
+
+def job_context(job, default=None):
+    """Returns the context the current user attached to `job`, or `default`."""
+    return job.viewers.get(current_user(), default)
+
+
+def detach_job(name):
+    """Stops following the job kept under `name`."""
+    st.session_state.pop(name, None)
+    if name in st.query_params:
+        del st.query_params[name]
+
+
+def wait_for_job(job, poll_seconds=0.3):
+    """Shows the job's progress and streamed text until it finishes.
+
+    Only the page script sleeps here; the crew itself runs on the worker pool,
+    so a rerun or refresh simply reattaches to the same job.
+    """
+    queue = get_job_queue()
+    status = st.status("Please wait...")
+    placeholder = st.empty()
+    shown_events = 0
+    while not job.done:
+        if job.status == "queued":
+            status.update(label=f"Queued ({queue.position(job)} ahead)...")
+        else:
+            status.update(label="Working on it...")
+        for message in job.events[shown_events:]:
+            status.write(message)
+        shown_events = len(job.events)
+        if job.text:
+            placeholder.markdown(job.text + "▌")
+        time.sleep(poll_seconds)
+    status.update(label="Done" if job.status == "done" else "Failed", state="complete" if job.status == "done" else "error")
+    placeholder.empty()
@@ -1,6 +1,4 @@
-__import__('pysqlite3')
-import sys
-sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
+import bootstrap
 
 import streamlit as st 
 
@@ -31,8 +29,12 @@ with st.expander("Data Flows and Implementation Details"):
                 
         - The submitted question is not empty 
         - The submitted question contains alphabetic characters
+        - The submitted question is not a greeting or clearly about another subject, and belongs on this page rather than the Insights page; these are decided by keyword rules, without calling an LLM. Questions the rules do not recognise are passed on to the agents
         
-        If the submitted question passes these two checks, the submitted question is assigned to the ```prompt``` parameter of a function that consists of an AI agent workflow. 
+        Short definitional questions, such as "What is the MOP?", skip the planner and researcher agents: the writer answers directly from the indexed HDB passages.
+        When several questions are submitted at once, one per line, the planner and researcher run once over all of them, and the writer then answers each question concurrently in its own section.
+        The plan and research are written for any buyer and reused whenever the same question is asked again. Only the writer tailors the answer, using the bands of age, income and marital status that change HDB eligibility rather than the exact values.
+        If the submitted question passes these checks, the submitted question is assigned to the ```prompt``` parameter of a function that consists of an AI agent workflow. 
         If any profile details is given, it will be assigned to the ```profile``` parameter of the function. Otherwise, the ```profile``` parameter is set to None. 
                 
         **3. AI Agents**
@@ -41,26 +43,29 @@ with st.expander("Data Flows and Implementation Details"):
                 
         - :blue-background[**Agent Planner:**] Plans a clear outline of the answer to the submitted question. Takes into consideration the profile given, if any.
                        
-        - :blue-background[**Agent Researcher:**] Conducts research to gather accurate and relevant information regarding HDB resale properties. It has access to web search tools to the HDB official website to gather only necessary information that is relevant to the question and profile.
+        - :blue-background[**Agent Researcher:**] Conducts research to gather accurate and relevant information regarding HDB resale properties. It has access to a search tool over a pre-built index of the HDB official website to gather only necessary information that is relevant to the question and profile.
                 
         - :blue-background[**Agent Writer:**] Compiles findings by the Agent Researcher and follows the outline given by the Agent Planner. Writes a coherent response that is structured clearly, with appropriate sections and concise points that answers to the user's question and profile.
                 
         - :gray-background[**Task Plan:**] Identify key aspects of the question that relates to HDB resale flats and create an outline of key points that can target the question and user's profile.
-        If irrelevant, plan a safe and default answer, indicating that the question is out of scope and you cannot answer it. ```async_execution=True``` is applied here along with Task Research to improve performance and overall execution time.
+        If irrelevant, plan a safe and default answer, indicating that the question is out of scope and you cannot answer it. It runs in parallel with Task Research, as neither needs the other's output.
                 
-        - :gray-background[**Task Research:**] Gather HDB resale property information from the [HDB Official Website](https://www.hdb.gov.sg/cs/infoweb) using the ```WebsiteSearchTool``` that is relevant to the user's question and profile. 
+        - :gray-background[**Task Research:**] Gather HDB resale property information from the [HDB Official Website](https://www.hdb.gov.sg/cs/infoweb) that is relevant to the user's question and profile. 
+        The pages are crawled and embedded ahead of time into a Chroma collection by ```hdb_index.py```, so the agent only queries the pre-built index and never fetches pages while the user waits. 
         If question is not related to HDB resale property, do not force a link between the topic of the question and HDB resale flats. 
-        ```async_execution=True``` is applied here along with Task Plan to improve performance, as we anticipate that the web search will take some time. 
+        It runs in parallel with Task Plan, as we anticipate that the search will take some time. 
         The outline from the Agent Planner is not crucial for the Agent Researcher to do its task as the Agent Writer will compile the results from both agents.
     
         - :gray-background[**Task Write:**] Write a response that is structured clearly, with an engaging introduction, insightful points and a conclusion. 
         The response should answer the question if it is related to HDB resale flats.
                 
-        A ```Crew``` object is instantiated to manage the agents and tasks. ```crew.kickoff()``` is called with the given ```prompt``` and ```profile```.
+        The tasks are run by a small task graph (```TaskGraph``` in ```task_graph.py```) rather than a single crew. Task Plan and Task Research each run as their own one-agent crew, in parallel, and their results are cached per question for any profile. 
+        Task Write then runs once both are done, as a single streamed call for the user's profile bucket. Each request has a time limit and a token budget; a crew that runs over either is stopped.
                 
         **4. Result Processing**
         
-        Results obtained from the function is processed and displayed on the Streamlit App.
+        Results obtained from the function is processed and displayed on the Streamlit App. 
+        Progress is shown as each agent finishes, and the Agent Writer's answer is streamed onto the page token by token as it is generated.
                 
         """)
 st.image("case1.png")
@@ -81,8 +86,9 @@ with st.expander("Data Flows and Implementation Details"):
                 
         - The submitted question is not empty 
         - The submitted question contains alphabetic characters
+        - The submitted question is not a greeting or clearly about another subject, and belongs on this page rather than the Guide page; these are decided by keyword rules, without calling an LLM. Questions the rules do not recognise are passed on to the agents
         
-        If the submitted question passes these two checks, the submitted question is assigned to the ```topic``` parameter of a function that consists of an AI agent workflow. 
+        If the submitted question passes these checks, the submitted question is assigned to the ```topic``` parameter of a function that consists of an AI agent workflow. 
 
         **3. Data**
                 
@@ -96,11 +102,11 @@ with st.expander("Data Flows and Implementation Details"):
         Key aspects identified by the agent serves as a guide for the Content Analyst and Content Writer to perform their tasks. 
    
         - :blue-background[**Content Analyst:**] Analyses the data based on key aspects identified by the Content Planner and retrieves relevant statistics for the Content Writer and the Programmer to perform their tasks. 
-        It has access to ```create_pandas_dataframe_agent``` from LangChain to analyse the dataset, and is aware that the dataset only covers HDB resale statistics.
+        It has access to a precomputed statistics tool and a restricted query tool that filters, groups, aggregates and sorts the dataset without running generated code, a comparables tool that finds the most similar recent transactions near a given block (blocks missing from the offline coordinate table are placed at their town's centre), a trends tool with precomputed rolling medians, year-on-year changes, a price index and a 12-month exponential smoothing forecast for every town and flat type, and is aware that the dataset only covers HDB resale statistics.
                                 
         - :blue-background[**Content Writer:**] Writes a comprehensive report based on the outline given by the Content Planner and insights consolidated by the Content Analyst.
                 
-        - :blue-background[**Programmer:**] Generates Python code for visualisations based on the insights provided by the Content Analyst and key aspects provided by the Content Planner.      
+        - :blue-background[**Programmer:**] Specifies a chart (chart type, group-by columns, metric, filters and time range) as JSON based on the insights provided by the Content Analyst and key aspects provided by the Content Planner.      
                 
         - :gray-background[**Task Plan:**] Understand the submitted question and verify if question is related to HDB resale statistics. If relevant, identify key aspects of the question.
         If irrelevant, plan a safe and default answer, indicating that the question is out of scope and you cannot answer it. Do not assume that the data can be used to answer the question.
@@ -111,13 +117,14 @@ with st.expander("Data Flows and Implementation Details"):
         - :gray-background[**Task Write:**] Write a response that is structured clearly, with an engaging introduction, insightful points and a conclusion. 
         The response should answer the question if it is related to HDB resale statistics.
                 
-        - :gray-background[**Task Code:**] Generate a matplotlib code that could show a visualisation covering the key aspects given by the Content Planner and insights consolidated by the Content Analyst. Do not produce any graph if the question is not related to past HDB resale transactions.
+        - :gray-background[**Task Code:**] Produce a JSON chart specification that could show a visualisation covering the key aspects given by the Content Planner and insights consolidated by the Content Analyst. The application computes the chart's values directly from the dataset, so no statistics are re-typed by the agent. Do not produce any graph if the question is not related to past HDB resale transactions.
 
-        A ```Crew``` object is instantiated to manage the agents and tasks. ```crew.kickoff()``` is called with the given ```topic```.
+        The tasks are run by a small task graph (```TaskGraph``` in ```task_graph.py```) rather than a single crew, each agent's task running as its own one-agent crew. Task Plan runs first, then Task Analyze. 
+        Task Write and Task Code both need only the plan and the analysis, so they run in parallel; the report is streamed as it is written. Each request has a time limit and a token budget. A crew that runs over either is stopped: the report then falls back to the Content Analyst's statistics and the chart is left out.
                 
         **4. Result Processing**
         
-        Results obtained from the function is processed and displayed on the Streamlit App. If applicable, the generated code for visualisation is executed to produce the graph.
+        Results obtained from the function is processed and displayed on the Streamlit App. The Content Writer's report is streamed onto the page as it is generated. If applicable, the chart specification is computed from the dataset with pandas group-bys and drawn with Streamlit's native charts. Should the agent return matplotlib code instead, it is executed once in a separate, CPU- and memory-limited process and the resulting image is cached. The final report and a reference to its chart are kept once in a shared, size-limited store; each browser session only remembers the key of the answer it is showing.
                 
         """)
 st.image("case2.png")
\ No newline at end of file
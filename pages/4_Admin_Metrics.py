@@ -0,0 +1,106 @@
+import bootstrap
+
+import time
+import pandas as pd
+import streamlit as st
+
+from utility import check_password
+import telemetry
+from semantic_cache import get_semantic_cache
+from result_cache import get_result_cache
+from result_store import get_result_store
+
+st.set_page_config(
+    layout="wide",
+    page_title = "Admin Metrics"
+)
+
+if not check_password():
+    st.stop()
+
+st.title("Admin Metrics")
+
+window = st.selectbox(label = "Time window", options = ["Last hour", "Last 24 hours", "Last 7 days", "All time"], index = 1)
+window_seconds = {"Last hour": 3600, "Last 24 hours": 86400, "Last 7 days": 7 * 86400, "All time": None}[window]
+spans = telemetry.load_spans(time.time() - window_seconds if window_seconds else None)
+
+if spans.empty:
+    st.info("No requests have been recorded in this time window.")
+    st.stop()
+
+spans["time"] = pd.to_datetime(spans["started_at"], unit="s")
+spans["tokens"] = spans["prompt_tokens"] + spans["completion_tokens"]
+requests = spans[spans["kind"] == "request"]
+stages = spans[spans["kind"] != "request"]
+
+st.header("Requests")
+col1, col2, col3, col4 = st.columns(4)
+col1.metric("Requests", len(requests))
+col2.metric("p50 latency", f"{requests['seconds'].quantile(0.5):.1f}s")
+col3.metric("p95 latency", f"{requests['seconds'].quantile(0.95):.1f}s")
+col4.metric("Cache hit rate", f"{requests['cache_hit'].fillna(0).mean():.0%}")
+
+summary = requests.groupby("pipeline").agg(
+    requests=("seconds", "size"),
+    p50_seconds=("seconds", lambda s: s.quantile(0.5)),
+    p95_seconds=("seconds", lambda s: s.quantile(0.95)),
+    cache_hit_rate=("cache_hit", lambda s: s.fillna(0).mean()),
+    errors=("error", lambda s: s.notna().sum()),
+    prompt_tokens=("prompt_tokens", "sum"),
+    completion_tokens=("completion_tokens", "sum"),
+)
+st.dataframe(summary.round(2))
+
+frequency = "1min" if window_seconds == 3600 else ("1h" if window_seconds == 86400 else "1D")
+st.subheader("Throughput")
+st.bar_chart(requests.groupby(["pipeline", pd.Grouper(key="time", freq=frequency)]).size().unstack(0).fillna(0))
+
+st.subheader("Latency (p50 / p95)")
+latency = requests.set_index("time").resample(frequency)["seconds"]
+st.line_chart(pd.DataFrame({"p50": latency.quantile(0.5), "p95": latency.quantile(0.95)}).dropna())
+
+st.subheader("Token spend")
+st.area_chart(requests.set_index("time").resample(frequency)[["prompt_tokens", "completion_tokens"]].sum())
+
+st.header("Stages and tools")
+if stages.empty:
+    st.info("No stage timings in this time window.")
+else:
+    stage_summary = stages.groupby(["kind", "stage"]).agg(
+        calls=("seconds", "size"),
+        p50_seconds=("seconds", lambda s: s.quantile(0.5)),
+        p95_seconds=("seconds", lambda s: s.quantile(0.95)),
+        total_seconds=("seconds", "sum"),
+        tokens=("tokens", "sum"),
+        errors=("error", lambda s: s.notna().sum()),
+    )
+    st.dataframe(stage_summary.round(2))
+
+st.header("Time and token budgets")
+budget_events = spans[spans["kind"].isin(["budget", "degraded"])]
+col1, col2, col3 = st.columns(3)
+col1.metric("Deadline overruns", int(((budget_events["kind"] == "budget") & (budget_events["error"] == "deadline")).sum()))
+col2.metric("Token budget overruns", int(((budget_events["kind"] == "budget") & (budget_events["error"] == "tokens")).sum()))
+col3.metric("Degraded requests", budget_events.loc[budget_events["kind"] == "degraded", "request_id"].nunique())
+if not budget_events.empty:
+    st.dataframe(budget_events.groupby(["pipeline", "kind", "stage", "error"]).size().rename("events").reset_index())
+
+errors = spans[spans["error"].notna() & ~spans["kind"].isin(["budget", "degraded"])]
+if not errors.empty:
+    st.header("Recent errors")
+    st.dataframe(errors[["time", "pipeline", "stage", "error"]].tail(20))
+
+st.header("Semantic answer cache")
+st.json(get_semantic_cache().stats())
+
+st.header("Insights result cache")
+st.json(get_result_cache().stats())
+
+st.header("Shown answers")
+st.caption("Sessions keep only a key; each distinct answer is stored once, compressed, and the least recently used are evicted beyond the limits.")
+store_stats = get_result_store().stats()
+col1, col2, col3 = st.columns(3)
+col1.metric("Answers stored", f"{store_stats['entries']:,} / {store_stats['max_entries']:,}")
+col2.metric("Memory", f"{store_stats['bytes'] / 2**20:.1f} / {store_stats['max_bytes'] / 2**20:.0f} MB")
+col3.metric("Shared by sessions", f"{store_stats['duplicates']:,}")
+st.json(store_stats)
@@ -0,0 +1,215 @@
+from typing import List, Literal, Optional, Union
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from pydantic import BaseModel, Field, ValidationError, model_validator
+
+import telemetry
+from resale_data import load_resale_data
+
+CATEGORY_COLUMNS = ["town", "flat_type", "flat_model", "storey_range"]
+# Storey ranges are zero-padded ("01 TO 03"), so their labels sort in floor order; the other categories have no order.
+ORDERED_CATEGORY_COLUMNS = ["storey_range"]
+ORDERING_OPS = [">", ">=", "<", "<=", "between"]
+TEXT_COLUMNS = ["block", "street_name"]
+NUMERIC_COLUMNS = ["resale_price", "floor_area_sqm", "price_per_sqm", "remaining_lease", "lease_commence_date", "year"]
+ALL_COLUMNS = CATEGORY_COLUMNS + TEXT_COLUMNS + NUMERIC_COLUMNS + ["month"]
+MAX_ROWS = 200
+# Columns of a transaction listing, in display order.
+LISTING_COLUMNS = ["month", "town", "flat_type", "block", "street_name", "storey_range", "floor_area_sqm",
+                   "remaining_lease", "resale_price"]
+DERIVED_FROM = {"price_per_sqm": {"resale_price", "floor_area_sqm"}, "year": {"month"}}
+
+Column = Literal[tuple(ALL_COLUMNS)]
+GroupColumn = Literal[tuple(CATEGORY_COLUMNS + TEXT_COLUMNS + ["month", "year", "lease_commence_date"])]
+NumericColumn = Literal[tuple(NUMERIC_COLUMNS)]
+
+
+class Filter(BaseModel):
+    column: Column
+    op: Literal["==", "!=", "in", "not in", ">", ">=", "<", "<=", "between", "contains"]
+    value: Union[str, float, int, List[Union[str, float, int]]] = Field(
+        description='Months as "YYYY-MM"; categories in upper case, e.g. "TAMPINES", "4 ROOM"; "between" takes [low, high].'
+    )
+
+    @model_validator(mode="after")
+    def _check_order(self):
+        if self.op in ORDERING_OPS and self.column in CATEGORY_COLUMNS and self.column not in ORDERED_CATEGORY_COLUMNS:
+            raise ValueError(f"{self.column} has no order; use ==, !=, in or not in")
+        return self
+
+
+class Aggregate(BaseModel):
+    func: Literal["count", "mean", "median", "min", "max", "sum", "std", "p25", "p75"]
+    column: NumericColumn = "resale_price"
+
+
+class ResaleQuery(BaseModel):
+    """A filter / group / aggregate / sort / limit query over HDB resale transactions."""
+
+    filters: List[Filter] = Field(default_factory=list)
+    group_by: List[GroupColumn] = Field(default_factory=list)
+    aggregates: List[Aggregate] = Field(
+        default_factory=list, description="Leave empty with no group_by to list matching transactions."
+    )
+    sort_by: Optional[str] = Field(None, description="A group_by column or an aggregate name such as 'median_resale_price'.")
+    descending: bool = True
+    limit: int = Field(20, ge=1, le=MAX_ROWS)
+
+
+def _column(df, name):
+    if name == "price_per_sqm":
+        return df["resale_price"] / df["floor_area_sqm"]
+    if name == "year":
+        return df["month"].dt.year
+    return df[name]
+
+
+def _category_mask(series, values, negate=False):
+    # Compare integer category codes instead of strings, so the scan never touches text.
+    wanted = {str(v).upper() for v in values}
+    codes = [i for i, c in enumerate(series.cat.categories) if str(c).upper() in wanted]
+    mask = np.isin(series.cat.codes.to_numpy(), codes)
+    return ~mask if negate else mask
+
+
+def _ordered_category_mask(series, op, values):
+    # Compares the category labels once, then selects rows by code.
+    labels = pd.Series(series.cat.categories.astype(str).str.upper())
+    values = [str(v).upper() for v in values]
+    if op == "between":
+        if len(values) != 2:
+            raise ValueError("'between' needs [low, high]")
+        selected = labels.between(values[0], values[1])
+    else:
+        selected = {">": labels > values[0], ">=": labels >= values[0],
+                    "<": labels < values[0], "<=": labels <= values[0]}[op]
+    return np.isin(series.cat.codes.to_numpy(), np.flatnonzero(selected.to_numpy()))
+
+
+def _coerce(name, value):
+    if name == "month":
+        return pd.Timestamp(value)
+    if name in NUMERIC_COLUMNS:
+        return float(value)
+    return str(value).upper()
+
+
+def _filter_mask(df, f):
+    values = f.value if isinstance(f.value, list) else [f.value]
+    if f.column in CATEGORY_COLUMNS and f.op in ("==", "!=", "in", "not in"):
+        return _category_mask(df[f.column], values, negate=f.op in ("!=", "not in"))
+    if f.column in ORDERED_CATEGORY_COLUMNS and f.op in ORDERING_OPS:
+        return _ordered_category_mask(df[f.column], f.op, values)
+
+    series = _column(df, f.column)
+    if f.op == "contains":
+        return series.astype(str).str.upper().str.contains(str(values[0]).upper(), regex=False).to_numpy()
+    if f.column in TEXT_COLUMNS:
+        series = series.astype(str).str.upper()
+    if f.op == "between":
+        if len(values) != 2:
+            raise ValueError("'between' needs [low, high]")
+        low, high = _coerce(f.column, values[0]), _coerce(f.column, values[1])
+        if f.column == "month":
+            high = high + pd.offsets.MonthEnd(0)
+        return series.between(low, high).to_numpy()
+    if f.op in ("in", "not in"):
+        mask = series.isin([_coerce(f.column, v) for v in values]).to_numpy()
+        return ~mask if f.op == "not in" else mask
+    value = _coerce(f.column, values[0])
+    return {
+        "==": series == value, "!=": series != value, ">": series > value,
+        ">=": series >= value, "<": series < value, "<=": series <= value,
+    }[f.op].to_numpy()
+
+
+def _aggregate_name(aggregate):
+    return "transactions" if aggregate.func == "count" else f"{aggregate.func}_{aggregate.column}"
+
+
+def run_query(query, df=None):
+    """Executes a validated ResaleQuery with vectorized pandas operations."""
+    df = load_resale_data() if df is None else df
+    mask = np.ones(len(df), dtype=bool)
+    for f in query.filters:
+        mask &= _filter_mask(df, f)
+    # Only the columns the query touches are materialised for the matching rows, in a fixed order.
+    listing = not query.aggregates and not query.group_by
+    needed = LISTING_COLUMNS if listing else list(dict.fromkeys(query.group_by + [a.column for a in query.aggregates]))
+    source_columns = set()
+    for name in needed:
+        source_columns |= DERIVED_FROM.get(name, {name})
+    rows = df.loc[mask, sorted(source_columns)]
+    frame = pd.DataFrame({name: _column(rows, name) for name in needed})
+
+    if listing:
+        # Most recent first, so the limit keeps the latest transactions.
+        result = frame.sort_values("month", ascending=False, kind="stable")
+    else:
+        aggregates = query.aggregates or [Aggregate(func="count")]
+        named = {}
+        for aggregate in aggregates:
+            func = {"p25": lambda s: s.quantile(0.25), "p75": lambda s: s.quantile(0.75)}.get(
+                aggregate.func, "size" if aggregate.func == "count" else aggregate.func
+            )
+            named[_aggregate_name(aggregate)] = (aggregate.column, func)
+        if query.group_by:
+            result = frame.groupby(query.group_by, observed=True).agg(**named).reset_index()
+        else:
+            result = frame.assign(_all=0).groupby("_all").agg(**named).reset_index(drop=True)
+
+    if query.sort_by:
+        if query.sort_by not in result.columns:
+            raise ValueError(f"cannot sort by {query.sort_by!r}; available: {list(result.columns)}")
+        result = result.sort_values(query.sort_by, ascending=not query.descending, kind="stable")
+    return result.head(query.limit)
+
+
+@telemetry.traced("query_resale_data")
+def query_resale_data(
+    filters: Optional[List[dict]] = None,
+    group_by: Optional[List[str]] = None,
+    aggregates: Optional[List[dict]] = None,
+    sort_by: Optional[str] = None,
+    descending: bool = True,
+    limit: int = 20,
+) -> str:
+    """Filters, groups, aggregates, sorts and limits HDB resale transactions in one call.
+
+    filters: [{"column": "town", "op": "==", "value": "TAMPINES"},
+              {"column": "month", "op": "between", "value": ["2023-01", "2023-12"]}]
+        ops: ==, !=, in, not in, >, >=, <, <=, between, contains.
+    group_by: e.g. ["year", "flat_type"].
+    aggregates: [{"func": "median", "column": "resale_price"}, {"func": "count"}]
+        funcs: count, mean, median, min, max, sum, std, p25, p75.
+    sort_by: a group_by column or an aggregate name such as "median_resale_price".
+    Leave group_by and aggregates empty to list matching transactions, newest first.
+    """
+    try:
+        query = ResaleQuery(filters=filters or [], group_by=group_by or [], aggregates=aggregates or [],
+                            sort_by=sort_by, descending=descending, limit=limit)
+        result = run_query(query)
+    except (ValidationError, ValueError, TypeError, AttributeError) as e:
+        # Anything the validation missed is reported to the agent like an invalid query, not raised.
+        return f"Invalid query: {e}"
+    if result.empty:
+        return "No transactions match this query."
+    return result.round(1).to_markdown(index=False)
+
+
+@st.cache_resource(show_spinner=False)
+def query_tool():
+    """Wraps `query_resale_data` as a structured tool for the analyst agent, shared by every request."""
+    from langchain_core.tools import StructuredTool
+
+    return StructuredTool.from_function(
+        func=query_resale_data,
+        name="Query HDB resale transactions",
+        description=(
+            "Filter, group, aggregate, sort and limit HDB resale transactions in a single call. "
+            f"Columns: {', '.join(ALL_COLUMNS)}. Months run from 2017-01; use year for yearly trends. "
+            "Aggregates: count, mean, median, min, max, sum, std, p25, p75 of a numeric column."
+        ),
+    )
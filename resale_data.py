@@ -0,0 +1,267 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+CSV_PATH = "ResaleflatpricesbasedonregistrationdatefromJan2017onwards.csv"
+# One Parquet file per month, so new months are appended without rewriting the rest.
+STORE_PATH = os.path.join("db", "resale")
+CACHE_META_PATH = os.path.join(STORE_PATH, "_meta.json")
+ARROW_PATH = os.path.join("db", "resale.arrow")
+
+CATEGORICAL_COLUMNS = ["town", "flat_type", "flat_model", "storey_range"]
+
+# Sessions share one frame; copy-on-write makes any derived frame copy before
+# it is modified instead of writing through to the shared buffers.
+pd.set_option("mode.copy_on_write", True)
+
+# Text columns stay Arrow-backed when read from the snapshot rather than becoming Python objects.
+_ARROW_TYPES = {pa.string(): pd.StringDtype("pyarrow"), pa.large_string(): pd.StringDtype("pyarrow")}
+
+
+def file_sha256(path):
+    """Returns the hex sha256 digest of the file at `path`."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_remaining_lease(values):
+    """Converts strings such as '61 years 04 months' into fractional years."""
+    parts = values.astype(str).str.extract(r"(\d+)\s*years?(?:\s*(\d+)\s*months?)?")
+    years = pd.to_numeric(parts[0], errors="coerce")
+    months = pd.to_numeric(parts[1], errors="coerce").fillna(0)
+    return (years + months / 12).astype("float32")
+
+
+def normalise_resale_frame(df):
+    """Applies the typed schema used throughout the app to a raw resale frame."""
+    df = df.copy()
+    df["month"] = pd.to_datetime(df["month"], format="%Y-%m")
+    for column in CATEGORICAL_COLUMNS:
+        df[column] = df[column].astype("category")
+    # Block numbers such as "123A" are text; an extract without letters would otherwise be read as integers.
+    for column in ["block", "street_name"]:
+        df[column] = df[column].astype(str)
+    df["remaining_lease"] = parse_remaining_lease(df["remaining_lease"])
+    df["floor_area_sqm"] = pd.to_numeric(df["floor_area_sqm"], errors="coerce").astype("float32")
+    df["lease_commence_date"] = pd.to_numeric(df["lease_commence_date"], errors="coerce").astype("Int16")
+    df["resale_price"] = pd.to_numeric(df["resale_price"], errors="coerce").astype("float64")
+    return df
+
+
+def _replace_atomically(path, write):
+    # Several server processes may rebuild at once; readers only ever see a complete file.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _read_cache_meta():
+    try:
+        with open(CACHE_META_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache_meta(meta):
+    def write(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+
+    _replace_atomically(CACHE_META_PATH, write)
+
+
+def write_arrow_snapshot(df, path=ARROW_PATH):
+    """Writes `df` as an uncompressed Arrow IPC file that every process can memory-map."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    def write(tmp_path):
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    _replace_atomically(path, write)
+
+
+def read_arrow_snapshot(path=ARROW_PATH):
+    """Memory-maps the Arrow snapshot and wraps it in a DataFrame without copying column data.
+
+    Pages of the file live in the OS page cache, so processes on the same host
+    share one physical copy of the dataset.
+    """
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table.to_pandas(split_blocks=True, types_mapper=_ARROW_TYPES.get)
+
+
+def _partition_path(month):
+    return os.path.join(STORE_PATH, f"month={month}.parquet")
+
+
+def _month_keys(df):
+    return df["month"].dt.strftime("%Y-%m")
+
+
+def write_partitions(df):
+    """Writes one Parquet partition per month in `df`, replacing those months' existing partitions."""
+    months = _month_keys(df)
+    for month, partition in df.groupby(months, sort=True):
+        _replace_atomically(_partition_path(month), lambda tmp_path: partition.to_parquet(tmp_path, index=False))
+    return sorted(months.unique())
+
+
+def read_partitions(months=None):
+    """Reads the given months (default: all) from the partitioned store as one typed frame."""
+    if months is None:
+        paths = sorted(glob.glob(_partition_path("*")))
+    else:
+        paths = [_partition_path(month) for month in months if os.path.exists(_partition_path(month))]
+    if not paths:
+        return None
+    df = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+    # Partitions carry their own category sets, which concat widens to object.
+    for column in CATEGORICAL_COLUMNS:
+        df[column] = df[column].astype("category")
+    return df
+
+
+def build_parquet_cache(csv_path=CSV_PATH):
+    """Parses the CSV once and writes the partitioned Parquet store and Arrow snapshot, returning the frame.
+
+    This is a full rebuild from the CSV snapshot; months ingested since are dropped.
+    """
+    stat = os.stat(csv_path)
+    df = normalise_resale_frame(pd.read_csv(csv_path))
+    for path in glob.glob(_partition_path("*")):
+        os.remove(path)
+    months = write_partitions(df)
+    write_arrow_snapshot(df)
+    sha256 = file_sha256(csv_path)
+    _write_cache_meta({
+        "source": os.path.abspath(csv_path),
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "sha256": sha256,
+        "version": sha256[:12],
+        "months": months,
+        "ingested": [],
+    })
+    return df
+
+
+def _occurrence_keys(df):
+    # Identical transactions do happen (same block, month, storey and price), so rows are
+    # matched as a multiset: the n-th copy of a row only matches the n-th copy on the other side.
+    rows = df.astype(str)
+    return pd.MultiIndex.from_frame(rows.assign(_occurrence=rows.groupby(list(rows.columns)).cumcount()))
+
+
+def ingest_month_file(csv_path):
+    """Appends the transactions in a monthly CSV extract that are not already in the store.
+
+    Only the months present in the file are rewritten. When anything is added
+    the dataset version changes, which invalidates every structure keyed on it.
+    Returns a summary with the previous and new versions and the affected months.
+    """
+    meta = _read_cache_meta()
+    if not meta or not os.path.exists(ARROW_PATH):
+        raise RuntimeError("Build the dataset before ingesting new months.")
+    incoming = normalise_resale_frame(pd.read_csv(csv_path))
+    existing = read_partitions(sorted(_month_keys(incoming).unique()))
+    if existing is not None:
+        incoming = incoming[~_occurrence_keys(incoming).isin(_occurrence_keys(existing))]
+    summary = {"file": os.path.abspath(csv_path), "rows": len(incoming), "months": [],
+               "previous_version": meta["version"], "version": meta["version"]}
+    if incoming.empty:
+        return summary
+
+    months = sorted(_month_keys(incoming).unique())
+    affected = incoming if existing is None else pd.concat([existing, incoming], ignore_index=True)
+    write_partitions(affected[_month_keys(affected).isin(months)])
+
+    combined = pd.concat([read_arrow_snapshot(), incoming], ignore_index=True)
+    for column in CATEGORICAL_COLUMNS:
+        combined[column] = combined[column].astype("category")
+    write_arrow_snapshot(combined.sort_values("month", kind="stable", ignore_index=True))
+
+    digest = hashlib.sha256(meta["version"].encode())
+    digest.update(pd.util.hash_pandas_object(incoming, index=False).to_numpy().tobytes())
+    summary.update(months=months, version=digest.hexdigest()[:12])
+    meta["version"] = summary["version"]
+    meta["months"] = sorted(set(meta.get("months", [])) | set(months))
+    meta.setdefault("ingested", []).append({
+        "file": summary["file"], "sha256": file_sha256(csv_path), "rows": len(incoming), "months": months,
+    })
+    _write_cache_meta(meta)
+    return summary
+
+
+def cache_is_fresh(csv_path=CSV_PATH):
+    """Checks the Parquet store against the source CSV's mtime, falling back to its hash."""
+    meta = _read_cache_meta()
+    if not meta or not glob.glob(_partition_path("*")):
+        return False
+    stat = os.stat(csv_path)
+    if meta.get("mtime") == stat.st_mtime and meta.get("size") == stat.st_size:
+        return True
+    # The file was touched or copied; only rebuild if the content really changed.
+    if meta.get("sha256") == file_sha256(csv_path):
+        meta["mtime"] = stat.st_mtime
+        meta["size"] = stat.st_size
+        _write_cache_meta(meta)
+        return True
+    return False
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_resale_data(csv_path, mtime, version):
+    if not cache_is_fresh(csv_path):
+        build_parquet_cache(csv_path)
+    elif not os.path.exists(ARROW_PATH):
+        write_arrow_snapshot(read_partitions())
+    return read_arrow_snapshot()
+
+
+def load_resale_data(csv_path=CSV_PATH):
+    """Returns the process-wide resale frame, shared read-only by every session.
+
+    The frame is backed by the memory-mapped Arrow snapshot, so server
+    processes on one host do not each hold a private copy. Ingesting a new
+    month changes the dataset version, and every process picks up the new
+    snapshot on its next call.
+    """
+    return _load_resale_data(csv_path, os.stat(csv_path).st_mtime, _read_cache_meta().get("version"))
+
+
+def dataset_version(csv_path=CSV_PATH):
+    """Returns a short identifier of the loaded dataset, for keying derived structures."""
+    load_resale_data(csv_path)
+    return _read_cache_meta().get("version", "")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds the resale data store, or appends new monthly extracts to it.")
+    parser.add_argument("--ingest", nargs="+", metavar="CSV", help="monthly CSV extracts to append")
+    args = parser.parse_args()
+    if not args.ingest:
+        frame = build_parquet_cache()
+        print(f"Wrote {len(frame)} rows to {STORE_PATH} and {ARROW_PATH}")
+    else:
+        from aggregates import update_cube
+        from trends import update_trends
+
+        for path in args.ingest:
+            summary = ingest_month_file(path)
+            if summary["months"]:
+                update_cube(summary["previous_version"], summary["version"], summary["months"])
+                update_trends(summary["version"])
+            print(f"{path}: added {summary['rows']} rows for {', '.join(summary['months']) or 'no new months'}; "
+                  f"dataset version {summary['version']}")
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+from semantic_cache import normalise_question
+
+RESULT_CACHE_PATH = os.path.join("db", "result_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "2000"))
+
+
+def result_key(topic, version, config):
+    """Returns the cache key of an answer: the normalised topic, the dataset version and the pipeline config."""
+    return hashlib.sha256(f"{normalise_question(topic)}\0{version}\0{config}".encode()).hexdigest()
+
+
+class ResultCache:
+    """Persistent cache of full Insights pipeline results, evicting the least recently used beyond `max_entries`.
+
+    Entries are keyed on the dataset version and the pipeline config, so
+    ingesting new data or changing a prompt makes old answers unreachable;
+    they age out through the LRU bound rather than being deleted eagerly.
+    """
+
+    def __init__(self, path=RESULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                topic TEXT NOT NULL,
+                version TEXT NOT NULL,
+                config TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_hit_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS results_last_hit_at ON results (last_hit_at);
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+
+    def _count(self, name, amount=1):
+        self._conn.execute(
+            "INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def get(self, topic, version, config):
+        """Returns the stored result dict for this topic, dataset version and config, or None."""
+        key = result_key(topic, version, config)
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            self._conn.execute("UPDATE results SET hits = hits + 1, last_hit_at = ? WHERE key = ?", (time.time(), key))
+            self._count("hits")
+        return json.loads(row[0])
+
+    def put(self, topic, version, config, result):
+        """Saves a result dict, then drops the least recently used overflow."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, topic, version, config, result, created_at, last_hit_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (result_key(topic, version, config), normalise_question(topic), version, config,
+                 json.dumps(result), now, now),
+            )
+            evicted = self._conn.execute(
+                "DELETE FROM results WHERE key NOT IN (SELECT key FROM results ORDER BY last_hit_at DESC LIMIT ?)",
+                (self.max_entries,),
+            ).rowcount
+            if evicted:
+                self._count("evictions", evicted)
+
+    def stats(self):
+        """Returns the hit/miss/eviction counters, the hit rate, the number of entries and their size in bytes."""
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(result)), 0) FROM results").fetchone()
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": counters.get("hits", 0) / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache():
+    """Returns the process-wide Insights result cache."""
+    return ResultCache()
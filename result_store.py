@@ -0,0 +1,100 @@
+"""Content-addressed, in-memory store of the answers shown on the pages.
+
+A finished answer is reduced to a small record: its markdown, a reference to
+its chart and a little metadata. The record is stored once per process under
+the hash of its content, so every session showing the same answer shares one
+copy, and sessions keep only the key in `st.session_state`. Records are held as
+compressed JSON bytes, which keeps them small and means no session can alter
+the shared copy. The store evicts the least recently used records beyond its
+entry and byte limits; a page whose record was evicted asks for the question again.
+"""
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+import streamlit as st
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", "1000"))
+DEFAULT_MAX_BYTES = int(float(os.getenv("RESULT_STORE_MAX_MB", "32")) * 2**20)
+
+
+def make_record(markdown, chart=None, meta=None):
+    """Builds a record: the final `markdown`, a `chart` reference and `meta`, all JSON-serialisable.
+
+    `chart` is either {"spec": text} for the Programmer's chart spec or code,
+    or {"type": "line" | "bar", "x", "y", "columns", "data"} for a quick-answer table.
+    """
+    return {"markdown": markdown or "", "chart": chart, "meta": meta or {}}
+
+
+def table_chart(chart_type, table, x, y):
+    """Returns the chart reference of a quick-answer table, with its rows as plain JSON values."""
+    split = json.loads(table.to_json(orient="split", index=False, date_format="iso"))
+    return {"type": chart_type, "x": x, "y": y, "columns": split["columns"], "data": split["data"]}
+
+
+class ResultStore:
+    """Process-wide LRU store of records, bounded by `max_entries` and `max_bytes` of compressed content."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._records = OrderedDict()
+        self._bytes = 0
+        self._counters = {"puts": 0, "duplicates": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+    def put(self, record):
+        """Stores a record and returns its key. Storing an identical record again returns the same key."""
+        canonical = json.dumps(record, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+        key = hashlib.sha256(canonical).hexdigest()
+        with self._lock:
+            self._counters["puts"] += 1
+            if key in self._records:
+                self._counters["duplicates"] += 1
+                self._records.move_to_end(key)
+                return key
+            blob = zlib.compress(canonical)
+            self._records[key] = blob
+            self._bytes += len(blob)
+            # The newest record always stays, even if it alone is over the byte limit.
+            while len(self._records) > 1 and (len(self._records) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._records.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._counters["evictions"] += 1
+        return key
+
+    def get(self, key):
+        """Returns a fresh copy of the record stored under `key`, or None if it is unknown or was evicted."""
+        if not key:
+            return None
+        with self._lock:
+            blob = self._records.get(key)
+            if blob is None:
+                self._counters["misses"] += 1
+                return None
+            self._records.move_to_end(key)
+            self._counters["hits"] += 1
+        return json.loads(zlib.decompress(blob))
+
+    def stats(self):
+        """Returns the counters, the number of records, their compressed size and the configured limits."""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._records),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+
+@st.cache_resource(show_spinner=False)
+def get_result_store():
+    """Returns the process-wide result store."""
+    return ResultStore()
@@ -0,0 +1,174 @@
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import streamlit as st
+
+CACHE_PATH = os.path.join("db", "semantic_cache.sqlite3")
+EMBEDDING_MODEL = os.getenv("SEMANTIC_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+DEFAULT_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+DEFAULT_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_DAYS", "7")) * 24 * 3600
+DEFAULT_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+
+# Thresholds that change HDB eligibility, grants or loan limits.
+AGE_BANDS = [(21, "under 21"), (35, "21-34"), (55, "35-54")]
+INCOME_BANDS = [(7000, "up to 7,000"), (14000, "7,001-14,000"), (21000, "14,001-21,000")]
+
+
+def normalise_question(question):
+    """Lowercases the question and strips punctuation and repeated whitespace."""
+    text = re.sub(r"[^\w\s$%-]", " ", question.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _band(value, bands, top, inclusive=False):
+    for limit, label in bands:
+        if value < limit or (inclusive and value == limit):
+            return label
+    return top
+
+
+def profile_bucket(profile):
+    """Maps a profile dict onto the coarse bands that change what the answer should say."""
+    profile = profile or {}
+    bucket = {}
+    if profile.get("age") is not None:
+        bucket["age"] = _band(profile["age"], AGE_BANDS, "55 and above")
+    if profile.get("monthly household income") is not None:
+        bucket["income"] = _band(profile["monthly household income"], INCOME_BANDS, "above 21,000", inclusive=True)
+    if profile.get("marital status"):
+        bucket["marital"] = profile["marital status"]
+    return json.dumps(bucket, sort_keys=True)
+
+
+@st.cache_resource(show_spinner=False)
+def _openai_client():
+    from openai import OpenAI
+
+    return OpenAI()
+
+
+@functools.lru_cache(maxsize=512)
+def embed(text):
+    """Returns the unit-normalised embedding of `text`."""
+    response = _openai_client().embeddings.create(model=EMBEDDING_MODEL, input=text)
+    vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class SemanticCache:
+    """Persistent answer cache matched on question similarity within a profile bucket."""
+
+    def __init__(self, path=CACHE_PATH, threshold=DEFAULT_THRESHOLD,
+                 ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY,
+                bucket TEXT NOT NULL,
+                question TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_hit_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS answers_bucket ON answers (bucket);
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+
+    def _count(self, name, amount=1):
+        self._conn.execute(
+            "INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def lookup(self, question, profile):
+        """Returns the stored answer closest to `question` for this profile bucket, or None."""
+        vector = embed(normalise_question(question))
+        now = time.time()
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT id, embedding, answer FROM answers WHERE bucket = ? AND created_at > ?",
+                (profile_bucket(profile), now - self.ttl_seconds),
+            ).fetchall()
+            if rows:
+                matrix = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._conn.execute(
+                        "UPDATE answers SET hits = hits + 1, last_hit_at = ? WHERE id = ?", (now, rows[best][0])
+                    )
+                    self._count("hits")
+                    return rows[best][2]
+            self._count("misses")
+        return None
+
+    def nearest(self, question, profile, min_score=0.8):
+        """Returns the closest stored answer for this profile bucket, if at least `min_score` similar.
+
+        This is a fallback for when a question cannot be answered in time, so
+        it ignores the TTL and the usual threshold and is not counted as a hit.
+        """
+        vector = embed(normalise_question(question))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT embedding, answer FROM answers WHERE bucket = ?", (profile_bucket(profile),)
+            ).fetchall()
+        if not rows:
+            return None
+        matrix = np.frombuffer(b"".join(row[0] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        return rows[best][1] if scores[best] >= min_score else None
+
+    def store(self, question, profile, answer):
+        """Saves an answer, then drops expired entries and the least recently used overflow."""
+        normalised = normalise_question(question)
+        vector = embed(normalised)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO answers (bucket, question, embedding, answer, created_at, last_hit_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (profile_bucket(profile), normalised, vector.tobytes(), str(answer), now, now),
+            )
+            evicted = self._conn.execute(
+                "DELETE FROM answers WHERE created_at <= ?", (now - self.ttl_seconds,)
+            ).rowcount
+            evicted += self._conn.execute(
+                "DELETE FROM answers WHERE id NOT IN (SELECT id FROM answers ORDER BY last_hit_at DESC LIMIT ?)",
+                (self.max_entries,),
+            ).rowcount
+            if evicted:
+                self._count("evictions", evicted)
+
+    def stats(self):
+        """Returns the hit/miss/eviction counters, the hit rate and the number of stored entries."""
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": counters.get("hits", 0) / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+@st.cache_resource(show_spinner=False)
+def get_semantic_cache():
+    """Returns the process-wide semantic cache."""
+    return SemanticCache()
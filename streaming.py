@@ -0,0 +1,89 @@
+import os
+import time
+
+import streamlit as st
+
+import telemetry
+
+
+@st.cache_resource(show_spinner=False)
+def chat_model(model, temperature):
+    """Returns the process-wide streaming chat client for `model` at `temperature`."""
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(model=model, temperature=temperature, streaming=True, stream_usage=True)
+
+
+def stream_llm(system_prompt, user_prompt, on_token=None, temperature=0.7, stage="writer"):
+    """Runs one chat completion, passing each token to `on_token`, and returns the full text.
+
+    The call is recorded as a telemetry span named `stage`, with its token usage.
+    If the request runs out of time or tokens mid-stream, the stream is closed
+    and BudgetExceeded is raised carrying the text produced so far.
+    """
+    llm = chat_model(os.environ["OPENAI_MODEL_NAME"], temperature)
+    parts = []
+    with telemetry.span(stage, "llm") as usage:
+        stream = llm.stream([("system", system_prompt), ("human", user_prompt)])
+        for chunk in stream:
+            if chunk.usage_metadata:
+                usage["prompt_tokens"] += chunk.usage_metadata["input_tokens"]
+                usage["completion_tokens"] += chunk.usage_metadata["output_tokens"]
+            if chunk.content:
+                parts.append(chunk.content)
+                if on_token:
+                    on_token(chunk.content)
+            # Each chunk is about one token; usage is only reported at the end of the stream.
+            reason = telemetry.over_budget(extra_tokens=len(parts))
+            if reason:
+                stream.close()
+                usage["completion_tokens"] += len(parts)
+                telemetry.record(stage, "budget", time.time(), 0, error=reason)
+                raise telemetry.BudgetExceeded(reason, stage, "".join(parts))
+    return "".join(parts)
+
+
+def budget_fallback(error, context, what="answer"):
+    """Returns the text shown when a writer ran out of budget: its partial output, else `context`."""
+    reason = "time" if error.reason == "deadline" else "its token budget"
+    if error.partial:
+        return f"{error.partial}\n\n_This {what} was cut short because the request ran out of {reason}._"
+    return (f"_The full {what} could not be written because the request ran out of {reason}. "
+            f"This is what was gathered so far:_\n\n{context}")
+
+
+def interpolate(template, inputs):
+    """Fills `{name}` placeholders the way CrewAI interpolates agent and task inputs."""
+    for key, value in inputs.items():
+        template = template.replace("{" + key + "}", str(value))
+    return template
+
+
+def agent_prompts(agent, task, inputs, context):
+    """Builds the system and user prompts CrewAI would send for `task` run by `agent`.
+
+    `agent` holds a role, goal and backstory, `task` a description and expected
+    output, and `context` the raw outputs of the tasks it depends on.
+    """
+    system_prompt = (
+        f"You are {agent['role']}. {interpolate(agent['backstory'], inputs)}\n"
+        f"Your personal goal is: {interpolate(agent['goal'], inputs)}"
+    )
+    user_prompt = (
+        f"Current Task: {interpolate(task['description'], inputs)}\n\n"
+        f"This is the expect criteria for your final answer: {interpolate(task['expected_output'], inputs)}\n"
+        "you MUST return the actual complete content as the final answer, not a summary.\n\n"
+        "This is the context you're working with:\n" + "\n\n----------\n\n".join(context)
+    )
+    return system_prompt, user_prompt
+
+
+def task_done_callback(on_event, labels):
+    """Returns a crew `task_callback` reporting finished tasks as progress events.
+
+    `labels` maps agent roles to the message sent when that agent's task is done.
+    """
+    def callback(output):
+        if on_event:
+            on_event(labels.get(output.agent, f"{output.agent} done"))
+    return callback
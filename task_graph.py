@@ -0,0 +1,154 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import telemetry
+
+
+class TaskGraph:
+    """A small dependency DAG of pipeline steps, run with independent steps in parallel.
+
+    Each step is a function receiving a dict of its dependencies' outputs. Steps
+    start as soon as everything they depend on has finished. A step with a
+    `fallback` that runs out of time or tokens is replaced by the fallback's
+    result, so the rest of the graph still completes.
+    """
+
+    def __init__(self):
+        self._steps = {}
+
+    def add(self, name, fn, depends_on=(), fallback=None):
+        """Adds a step; its dependencies must already have been added.
+
+        `fallback(inputs, error)` is called with the step's inputs and the
+        BudgetExceeded error if the step runs out of budget.
+        """
+        missing = [dep for dep in depends_on if dep not in self._steps]
+        if missing:
+            raise ValueError(f"{name} depends on unknown steps {missing}")
+        self._steps[name] = (fn, tuple(depends_on), fallback)
+        return self
+
+    def run(self, max_workers=4):
+        """Runs every step and returns (outputs, timings) keyed by step name.
+
+        Timings record each step's start and end in seconds from the start of
+        the run, and its duration, and whether a fallback replaced it. The
+        first failing step's exception is raised once running steps finish;
+        steps not yet started are skipped.
+        """
+        outputs, timings = {}, {}
+        started = time.perf_counter()
+        pending = dict(self._steps)
+        running = {}
+        degraded = set()
+
+        def timed(name, fn, fallback, inputs):
+            start = time.perf_counter() - started
+            try:
+                return fn(inputs)
+            except telemetry.BudgetExceeded as e:
+                if fallback is None:
+                    raise
+                telemetry.record_degraded(name, e.reason)
+                degraded.add(name)
+                return fallback(inputs, e)
+            finally:
+                end = time.perf_counter() - started
+                timings[name] = {"start": round(start, 3), "end": round(end, 3), "seconds": round(end - start, 3),
+                                 "degraded": name in degraded}
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="task-graph") as executor:
+            while pending or running:
+                ready = [name for name, (_, deps, _) in pending.items() if all(dep in outputs for dep in deps)]
+                for name in ready:
+                    fn, deps, fallback = pending.pop(name)
+                    # Copy the context so per-request state such as telemetry follows the step's thread.
+                    context = contextvars.copy_context()
+                    future = executor.submit(context.run, timed, name, fn, fallback, {dep: outputs[dep] for dep in deps})
+                    running[future] = name
+                if not running:
+                    raise ValueError(f"steps {list(pending)} can never run")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        wait(running)
+                        raise future.exception()
+                    outputs[name] = future.result()
+        return outputs, timings
+
+
+def _crew_usage(crew):
+    """Returns the (prompt, completion) tokens a crew has used so far, including one that did not finish."""
+    metrics = getattr(crew, "calculate_usage_metrics", None)
+    metrics = metrics() if metrics else None
+    if not metrics:
+        return 0, 0
+    return getattr(metrics, "prompt_tokens", 0), getattr(metrics, "completion_tokens", 0)
+
+
+def run_crew_task(agent, task, inputs, task_callback=None):
+    """Runs a single task as its own crew and records it as a telemetry span named after the agent.
+
+    Tasks listed in `task.context` must have run already, so their outputs are set.
+    Inside a request, a step callback stops the crew after its next LLM step
+    once the request, counting this crew's tokens so far, is out of time or
+    tokens. Past the deadline BudgetExceeded is raised at once; the crew is
+    cancelled at its next step, and the tokens it spent while winding down are
+    recorded as a "budget" span with error "cancelled".
+    """
+    from crewai import Crew
+
+    cancelled = threading.Event()
+
+    def step_callback(step):
+        # The crew's own tokens only reach the request's totals when its span ends, so count them here.
+        reason = "deadline" if cancelled.is_set() else telemetry.over_budget(sum(_crew_usage(crew)))
+        if reason:
+            # CrewAI retries a failed task; a cancelled one must not start again.
+            agent.max_retry_limit = 0
+            raise telemetry.BudgetExceeded(reason, agent.role)
+
+    with telemetry.span(agent.role) as usage:
+        remaining = telemetry.remaining_seconds()
+        crew = Crew(agents=[agent], tasks=[task], task_callback=task_callback, step_callback=step_callback, verbose=True)
+        if remaining is None:
+            output = crew.kickoff(inputs=inputs)
+        else:
+            result = {}
+            handoff = threading.Lock()
+
+            def kickoff():
+                try:
+                    result["output"] = crew.kickoff(inputs=inputs)
+                except BaseException as e:
+                    result["error"] = e
+                    result["usage"] = _crew_usage(crew)
+                finally:
+                    with handoff:
+                        result["done"] = True
+                        abandoned = cancelled.is_set()
+                    if abandoned:
+                        prompt_tokens, completion_tokens = result.get("usage") or _crew_usage(crew)
+                        telemetry.record(agent.role, "budget", time.time(), 0, prompt_tokens, completion_tokens,
+                                         error="cancelled")
+
+            # A daemon thread, so a crew still winding down never holds up the caller or shutdown.
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(kickoff,),
+                                      name=f"crew-{agent.role}", daemon=True)
+            thread.start()
+            thread.join(max(remaining, 0))
+            with handoff:
+                if not result.get("done"):
+                    cancelled.set()
+            if cancelled.is_set():
+                telemetry.record(agent.role, "budget", time.time(), 0, error="deadline")
+                raise telemetry.BudgetExceeded("deadline", agent.role)
+            if "error" in result:
+                usage["prompt_tokens"], usage["completion_tokens"] = result["usage"]
+                raise result["error"]
+            output = result["output"]
+        telemetry.add_crew_usage(usage, output)
+    return output.raw
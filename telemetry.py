@@ -0,0 +1,214 @@
+import contextlib
+import contextvars
+import functools
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+TELEMETRY_PATH = os.path.join("db", "telemetry.sqlite3")
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("PIPELINE_DEADLINE_SECONDS", "120"))
+DEFAULT_TOKEN_BUDGET = int(os.getenv("PIPELINE_TOKEN_BUDGET", "60000"))
+
+_current = contextvars.ContextVar("telemetry_request", default=None)
+_lock = threading.Lock()
+_conn = None
+
+
+class BudgetExceeded(Exception):
+    """Raised at a stage or tool boundary once the current request is past its deadline or token budget.
+
+    `reason` is "deadline" or "tokens". A streamed stage that was cut short
+    keeps the text it had produced in `partial`.
+    """
+
+    def __init__(self, reason, stage, partial=""):
+        super().__init__(f"{reason} exceeded at {stage}")
+        self.reason = reason
+        self.stage = stage
+        self.partial = partial
+
+
+def _connection():
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(TELEMETRY_PATH), exist_ok=True)
+        _conn = sqlite3.connect(TELEMETRY_PATH, check_same_thread=False)
+        _conn.executescript("""
+            CREATE TABLE IF NOT EXISTS spans (
+                request_id TEXT NOT NULL,
+                pipeline TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                seconds REAL NOT NULL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                cache_hit INTEGER,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS spans_started_at ON spans (started_at);
+        """)
+    return _conn
+
+
+def record(stage, kind, started_at, seconds, prompt_tokens=0, completion_tokens=0, cache_hit=None, error=None):
+    """Writes one span for the current request. Outside a request it is recorded under its own id."""
+    trace = _current.get()
+    request_id, pipeline = (trace["id"], trace["pipeline"]) if trace else (uuid.uuid4().hex, "none")
+    with _lock:
+        if trace and kind != "request":
+            trace["prompt_tokens"] += prompt_tokens
+            trace["completion_tokens"] += completion_tokens
+        conn = _connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (request_id, pipeline, stage, kind, started_at, seconds, prompt_tokens, completion_tokens,
+                 None if cache_hit is None else int(cache_hit), error),
+            )
+
+
+@contextlib.contextmanager
+def request(pipeline, deadline_seconds=DEFAULT_DEADLINE_SECONDS, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Traces one user request; spans recorded inside it are attributed to it.
+
+    The request counts as a cache hit unless a pipeline calls `mark_cache_miss`.
+    Spans started after `deadline_seconds`, or once the request has used
+    `token_budget` tokens, raise BudgetExceeded.
+    """
+    trace = {"id": uuid.uuid4().hex, "pipeline": pipeline, "cache_hit": True,
+             "prompt_tokens": 0, "completion_tokens": 0,
+             "deadline": time.monotonic() + deadline_seconds, "token_budget": token_budget}
+    token = _current.set(trace)
+    started_at, start = time.time(), time.perf_counter()
+    error = None
+    try:
+        yield trace
+    except Exception as e:
+        error = f"{e.__class__.__name__}: {e}"
+        raise
+    finally:
+        record("request", "request", started_at, time.perf_counter() - start,
+               trace["prompt_tokens"], trace["completion_tokens"], trace["cache_hit"], error)
+        _current.reset(token)
+
+
+def record_fast_path(pipeline, stage, started_at, seconds, cache_hit=False):
+    """Records a request answered in front of the pipeline, which never starts a trace.
+
+    `stage` names what answered it and is recorded as a span of kind "fast_path".
+    """
+    token = _current.set({"id": uuid.uuid4().hex, "pipeline": pipeline, "prompt_tokens": 0, "completion_tokens": 0})
+    try:
+        record(stage, "fast_path", started_at, seconds)
+        record("request", "request", started_at, seconds, cache_hit=cache_hit)
+    finally:
+        _current.reset(token)
+
+
+def record_cache_hit(pipeline, started_at, seconds):
+    """Records a request answered by a cache in front of the pipeline."""
+    record_fast_path(pipeline, "cache", started_at, seconds, cache_hit=True)
+
+
+def mark_cache_miss():
+    """Notes that the current request had to run its pipeline."""
+    trace = _current.get()
+    if trace:
+        trace["cache_hit"] = False
+
+
+def remaining_seconds():
+    """Returns the seconds left before the current request's deadline, or None outside a budgeted request."""
+    trace = _current.get()
+    if not trace or "deadline" not in trace:
+        return None
+    return trace["deadline"] - time.monotonic()
+
+
+def over_budget(extra_tokens=0):
+    """Returns "deadline" or "tokens" if the current request has run out of either, else None.
+
+    `extra_tokens` counts usage not recorded yet, such as a stream in progress.
+    """
+    trace = _current.get()
+    if not trace or "deadline" not in trace:
+        return None
+    if time.monotonic() >= trace["deadline"]:
+        return "deadline"
+    if trace["prompt_tokens"] + trace["completion_tokens"] + extra_tokens >= trace["token_budget"]:
+        return "tokens"
+    return None
+
+
+def check_budget(stage):
+    """Raises BudgetExceeded, and records the overrun, if the current request is out of time or tokens."""
+    reason = over_budget()
+    if reason:
+        record(stage, "budget", time.time(), 0, error=reason)
+        raise BudgetExceeded(reason, stage)
+
+
+def record_degraded(stage, reason):
+    """Records that `stage` was replaced by a fallback result because of `reason`."""
+    record(stage, "degraded", time.time(), 0, error=reason)
+
+
+@contextlib.contextmanager
+def span(stage, kind="task"):
+    """Times a pipeline stage. Set `prompt_tokens`/`completion_tokens` on the yielded dict to record usage.
+
+    Inside a request, the stage is refused with BudgetExceeded once the request is out of time or tokens.
+    """
+    check_budget(stage)
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    started_at, start = time.time(), time.perf_counter()
+    error = None
+    try:
+        yield usage
+    except Exception as e:
+        error = f"{e.__class__.__name__}: {e}"
+        raise
+    finally:
+        record(stage, kind, started_at, time.perf_counter() - start,
+               usage["prompt_tokens"], usage["completion_tokens"], error=error)
+
+
+def traced(stage, kind="tool"):
+    """Decorates a function so each call is recorded as a span."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_crew_usage(usage, crew_output):
+    """Copies a CrewOutput's token usage onto a span's usage dict."""
+    metrics = getattr(crew_output, "token_usage", None)
+    if metrics:
+        usage["prompt_tokens"] += metrics.prompt_tokens
+        usage["completion_tokens"] += metrics.completion_tokens
+
+
+def instrument(pipeline, fn):
+    """Wraps a pipeline function so every call runs inside a traced request."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with request(pipeline):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def load_spans(since=None):
+    """Returns the recorded spans as a DataFrame, optionally only those started after `since`."""
+    import pandas as pd
+
+    with _lock:
+        return pd.read_sql_query(
+            "SELECT * FROM spans WHERE started_at >= ? ORDER BY started_at", _connection(), params=(since or 0,)
+        )
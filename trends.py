@@ -0,0 +1,251 @@
+"""Monthly price trends and short-term forecasts for every town x flat_type series.
+
+`build_trends` computes, in one pass over the dataset, the monthly median
+price of every town x flat_type series and of the all-towns and all-flat-types
+roll-ups, labelled ALL. For each series it then adds a rolling median trend,
+the year-on-year change, a price index against the series' own first year, and a damped
+Holt (exponential smoothing) forecast. All series are held as rows of one
+matrix, so each step is a single vectorized operation over every series at once.
+The result is one long frame of float32 columns, saved next to the cube for each dataset version.
+"""
+import glob
+import os
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import telemetry
+from resale_data import dataset_version, load_resale_data, read_arrow_snapshot
+
+TRENDS_DIR = "db"
+ALL = "ALL"
+ROLLING_MONTHS = 3
+HORIZON_MONTHS = 12
+MIN_HISTORY_MONTHS = 24
+
+# Smoothing parameters tried for every series; each series keeps the pair with the lowest one-step error.
+ALPHAS = [0.2, 0.4, 0.6, 0.8]
+BETAS = [0.05, 0.1, 0.2]
+DAMPING = 0.95
+
+
+def _monthly_medians(df):
+    """Returns the median price and transaction count of every series by month, as two wide frames."""
+    frames = []
+    for keys in (["town", "flat_type"], ["town"], ["flat_type"], []):
+        grouped = df.groupby(keys + ["month"], observed=True)["resale_price"]
+        stats = pd.DataFrame({"median_price": grouped.median(), "transactions": grouped.size()}).reset_index()
+        for column in ("town", "flat_type"):
+            stats[column] = stats[column].astype(str) if column in keys else ALL
+        frames.append(stats)
+    stats = pd.concat(frames, ignore_index=True)
+    months = pd.date_range(df["month"].min(), df["month"].max(), freq="MS")
+    median = stats.pivot(index=["town", "flat_type"], columns="month", values="median_price").reindex(columns=months)
+    counts = stats.pivot(index=["town", "flat_type"], columns="month", values="transactions").reindex(columns=months)
+    return median, counts.fillna(0)
+
+
+def holt_forecast(values, horizon=HORIZON_MONTHS, damping=DAMPING):
+    """Fits a damped Holt model to every row of `values` (series x months) and forecasts `horizon` months.
+
+    Leading NaNs are skipped: each series starts at its first observation.
+    Returns the forecasts (series x horizon) and the standard deviation of each
+    series' one-step errors. Series with fewer than MIN_HISTORY_MONTHS
+    observations, or none in the last month, get NaN forecasts.
+    """
+    grid = np.array([(alpha, beta) for alpha in ALPHAS for beta in BETAS])
+    alpha, beta = grid[:, :1], grid[:, 1:]
+    n_series = values.shape[0]
+    level = np.full((len(grid), n_series), np.nan)
+    slope = np.zeros((len(grid), n_series))
+    squared_error = np.zeros((len(grid), n_series))
+    observed = np.zeros(n_series)
+    for column in values.T:
+        valid = np.isfinite(column)
+        started = np.isfinite(level)
+        predicted = level + damping * slope
+        error = np.where(started & valid, column - predicted, 0.0)
+        squared_error += error ** 2
+        # Error-correction form of Holt's method; a series' first observation just sets its level.
+        level = np.where(started, predicted + alpha * error, np.where(valid, column, np.nan))
+        slope = np.where(started, damping * slope + alpha * beta * error, 0.0)
+        observed += valid
+
+    best = np.argmin(squared_error, axis=0)
+    series = np.arange(n_series)
+    level, slope = level[best, series], slope[best, series]
+    sigma = np.sqrt(squared_error[best, series] / np.maximum(observed - 1, 1))
+    steps = np.cumsum(damping ** np.arange(1, horizon + 1))
+    forecast = level[:, None] + slope[:, None] * steps[None, :]
+    usable = (observed >= MIN_HISTORY_MONTHS) & np.isfinite(values[:, -1])
+    forecast[~usable] = np.nan
+    return forecast, sigma
+
+
+def build_trends(df):
+    """Computes the trend frame: one row per series and month of history, then HORIZON_MONTHS of forecast.
+
+    Columns: town, flat_type, month, transactions, median_price, trend (the
+    rolling median, or the forecast), lower/upper (the forecast's approximate
+    95% range), yoy_change, price_index (the series' first year of data = 100)
+    and is_forecast.
+    """
+    median, counts = _monthly_medians(df)
+    months = median.columns
+    # Rolling statistics run down the months of every series at once.
+    trend = median.T.rolling(ROLLING_MONTHS, min_periods=1).median().T
+    trend = trend.T.interpolate(limit_area="inside").T
+    yoy_change = trend / trend.shift(12, axis=1) - 1
+    # Series start in different months, so each is indexed to its own first twelve months.
+    values = trend.to_numpy()
+    first = np.isfinite(values).argmax(axis=1)
+    offset = np.arange(len(months))[None, :] - first[:, None]
+    with np.errstate(invalid="ignore"):
+        base = pd.Series(np.nanmean(np.where((offset >= 0) & (offset < 12), values, np.nan), axis=1), index=trend.index)
+    price_index = trend.div(base, axis=0) * 100
+
+    forecast, sigma = holt_forecast(trend.to_numpy())
+    future = pd.date_range(months[-1] + pd.offsets.MonthBegin(1), periods=HORIZON_MONTHS, freq="MS")
+    # A rough range: the one-step error grows with the square root of the horizon.
+    spread = 1.96 * sigma[:, None] * np.sqrt(np.arange(1, HORIZON_MONTHS + 1))[None, :]
+    # Each forecast month is compared with the month a year before it, from history or earlier forecast.
+    year_before = np.concatenate([trend.to_numpy()[:, -12:], forecast], axis=1)[:, :HORIZON_MONTHS]
+    forecast_yoy = forecast / year_before - 1
+
+    towns, flat_types = median.index.get_level_values("town"), median.index.get_level_values("flat_type")
+    n_series = len(median.index)
+    history = pd.DataFrame({
+        "town": np.repeat(towns, len(months)),
+        "flat_type": np.repeat(flat_types, len(months)),
+        "month": np.tile(months, n_series),
+        "transactions": counts.to_numpy().ravel(),
+        "median_price": median.to_numpy().ravel(),
+        "trend": trend.to_numpy().ravel(),
+        "lower": np.nan,
+        "upper": np.nan,
+        "yoy_change": yoy_change.to_numpy().ravel(),
+        "price_index": price_index.to_numpy().ravel(),
+        "is_forecast": False,
+    })
+    projected = pd.DataFrame({
+        "town": np.repeat(towns, HORIZON_MONTHS),
+        "flat_type": np.repeat(flat_types, HORIZON_MONTHS),
+        "month": np.tile(future, n_series),
+        "transactions": 0,
+        "median_price": np.nan,
+        "trend": forecast.ravel(),
+        "lower": (forecast - spread).ravel(),
+        "upper": (forecast + spread).ravel(),
+        "yoy_change": forecast_yoy.ravel(),
+        "price_index": (forecast / base.to_numpy()[:, None] * 100).ravel(),
+        "is_forecast": True,
+    })
+    trends = pd.concat([history, projected], ignore_index=True).dropna(subset=["trend"])
+    trends = trends.astype({
+        "town": "category", "flat_type": "category", "transactions": "int32", "median_price": "float32",
+        "trend": "float32", "lower": "float32", "upper": "float32", "yoy_change": "float32", "price_index": "float32",
+    })
+    return trends.sort_values(["town", "flat_type", "month"], ignore_index=True)
+
+
+def _trends_path(version):
+    return os.path.join(TRENDS_DIR, f"resale_trends-{version}.parquet")
+
+
+def save_trends(trends, version):
+    """Saves the trend frame for dataset `version` and removes those of older versions."""
+    os.makedirs(TRENDS_DIR, exist_ok=True)
+    tmp_path = f"{_trends_path(version)}.{os.getpid()}.tmp"
+    trends.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, _trends_path(version))
+    for path in glob.glob(_trends_path("*")):
+        if path != _trends_path(version):
+            os.remove(path)
+
+
+def update_trends(version):
+    """Rebuilds and saves the trends after new months were ingested. Every series changes, so there is no partial update."""
+    trends = build_trends(read_arrow_snapshot())
+    save_trends(trends, version)
+    return trends
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_trends(version, _df):
+    if os.path.exists(_trends_path(version)):
+        return pd.read_parquet(_trends_path(version))
+    trends = build_trends(_df)
+    save_trends(trends, version)
+    return trends
+
+
+def load_trends():
+    """Returns the process-wide trend frame for the loaded dataset."""
+    return _load_trends(dataset_version(), load_resale_data())
+
+
+def series_trend(trends, town=None, flat_type=None):
+    """Returns the rows of one series, by month; an empty `town` or `flat_type` selects the ALL roll-up."""
+    town = (town or ALL).strip().upper()
+    flat_type = (flat_type or ALL).strip().upper()
+    rows = trends[(trends["town"].astype(str).str.upper() == town) & (trends["flat_type"].astype(str).str.upper() == flat_type)]
+    return rows.reset_index(drop=True)
+
+
+@telemetry.traced("price_trends")
+def price_trends(
+    town: Optional[str] = None,
+    flat_type: Optional[str] = None,
+    start_month: Optional[str] = None,
+) -> str:
+    """Returns the precomputed monthly price trend of HDB resale flats: a rolling median,
+    year-on-year change, a price index (the series' first year = 100) and a 12-month forecast with its range.
+
+    town: e.g. "TAMPINES"; leave empty for all towns. flat_type: e.g. "4 ROOM"; leave empty for all flat types.
+    start_month: "YYYY-MM", the first month of history to list (default: the last two years).
+    """
+    series = series_trend(load_trends(), town, flat_type)
+    if series.empty:
+        return "No price trend for these filters; towns and flat types are spelt as in the dataset, e.g. \"TAMPINES\", \"4 ROOM\"."
+    history, forecast = series[~series["is_forecast"]], series[series["is_forecast"]]
+    latest = history.iloc[-1]
+    scope = f"{flat_type or 'all flat types'} in {town or 'all towns'}"
+    lines = [f"Trend of {scope}, as a {ROLLING_MONTHS}-month rolling median of monthly median prices."]
+    # A series less than a year old has no year-on-year change yet.
+    yoy = f"{latest['yoy_change']:+.1%} year on year" if pd.notna(latest["yoy_change"]) else "no year-on-year change yet"
+    lines.append(f"Latest ({latest['month']:%Y-%m}): ${latest['trend']:,.0f}, {yoy}, index {latest['price_index']:.1f}.")
+    if forecast.empty:
+        lines.append("No forecast: this series has too few recent transactions.")
+    else:
+        end = forecast.iloc[-1]
+        lines.append(f"Forecast for {end['month']:%Y-%m}: ${end['trend']:,.0f} (range ${end['lower']:,.0f} to "
+                     f"${end['upper']:,.0f}). This is a damped exponential smoothing projection of the trend, not a prediction of any one sale.")
+
+    start = pd.Timestamp(start_month) if start_month else latest["month"] - pd.DateOffset(months=24)
+    # Quarter ends keep the table short enough for the agent's context.
+    shown = series[(series["month"] >= start) & (series["month"].dt.month % 3 == 0)]
+    table = pd.DataFrame({
+        "month": shown["month"].dt.strftime("%Y-%m"),
+        "trend": shown["trend"].round(0),
+        "yoy_change": (shown["yoy_change"] * 100).round(1).map(lambda change: f"{change}%" if pd.notna(change) else ""),
+        "price_index": shown["price_index"].round(1),
+        "forecast": shown["is_forecast"],
+    })
+    return "\n".join(lines) + "\n\n" + table.to_markdown(index=False)
+
+
+@st.cache_resource(show_spinner=False)
+def trends_tool():
+    """Wraps `price_trends` as a structured tool for the analyst agent, shared by every request."""
+    from langchain_core.tools import StructuredTool
+
+    return StructuredTool.from_function(
+        func=price_trends,
+        name="Price trends and forecast",
+        description=(
+            "Precomputed monthly price trend, year-on-year change, price index and 12-month forecast for any "
+            "town and flat type, or all of them. Use for questions about how prices have moved or will move."
+        ),
+    )